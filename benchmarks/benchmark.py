@@ -0,0 +1,161 @@
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from benchmarks.synthetic_event import SyntheticEventGenerator
+from results_analytics import results_analytics
+from results_plotter import results_plotter
+from results_reader import event_store
+from results_reader import results_reader
+import utils
+
+class Benchmark:
+    """
+    Time the main stages of loading and replaying an event on synthetic events of several sizes
+
+    Each stage is timed over a number of repeats and reported in milliseconds, so results from
+    different commits can be compared
+    """
+    def __init__(self, scales: "list[int]", repeats: int = 5, frames: int = 50,
+                 n_controls: int = 50, map_size: int = 4000):
+        self.scales = scales
+        self.repeats = repeats
+        self.frames = frames
+        self.n_controls = n_controls
+        self.map_size = map_size
+
+    def run(self) -> dict:
+        """
+        Run every stage at every scale and return the machine readable report
+        """
+        report = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": [],
+            "memory": [],
+        }
+        for n_teams in self.scales:
+            with tempfile.TemporaryDirectory() as event_directory:
+                generator = SyntheticEventGenerator(n_teams, self.n_controls, self.map_size)
+                config_path = generator.generate(Path(event_directory))
+                with open(config_path, "r") as config_fp:
+                    config = yaml.safe_load(config_fp)
+                timings, memory = self._run_scale(config, n_teams)
+                report["results"].extend(timings)
+                report["memory"].append(memory)
+        return report
+
+    def _run_scale(self, config: dict, n_teams: int) -> "tuple[list[dict], dict]":
+        """
+        Time every stage for a single event
+        Returns the timings and the memory used by the results
+        """
+        timings = []
+
+        def record(stage: str, durations: "list[float]", per: str = "call") -> None:
+            durations_ms = np.array(durations) * 1000
+            timings.append({
+                "teams": n_teams,
+                "stage": stage,
+                "per": per,
+                "mean_ms": float(durations_ms.mean()),
+                "median_ms": float(np.median(durations_ms)),
+                "min_ms": float(durations_ms.min()),
+                "max_ms": float(durations_ms.max()),
+                "samples": len(durations),
+            })
+
+        control_coords = utils.get_control_coordinates(config)
+        results_rdr = results_reader.ResultsReader(config, control_coords)
+
+        durations, results = _time_repeats(results_rdr.parse_txt_results_directory, self.repeats)
+        record("parse_txt_results_directory", durations)
+
+        durations, _ = _time_repeats(lambda: results_rdr.write_csv_results(results), self.repeats)
+        record("write_csv_results", durations)
+
+        durations, results = _time_repeats(results_rdr.parse_csv_results_directory, self.repeats)
+        record("parse_csv_results_directory", durations)
+
+        durations, store = _time_repeats(lambda: event_store.EventStore.from_results(results, control_coords), self.repeats)
+        record("EventStore.from_results", durations)
+
+        durations, _ = _time_repeats(lambda: results_analytics.ResultsAnalytics.for_config(config, store), self.repeats)
+        record("ResultsAnalytics.from_store", durations)
+
+        leg_stats = results_rdr.calculate_leg_statistics(results)
+        start = time.perf_counter()
+        pltr = results_plotter.ResultsPlotter(config, results, control_coords, leg_stats)
+        record("ResultsPlotter.__init__", [time.perf_counter() - start])
+
+        # frames spread evenly across the event, as played back by plot_results
+        event_times = np.linspace(0, (config["event_length"] + 0.5) * 3600, self.frames)
+
+        record("_get_leading_teams", _time_frames(pltr._get_leading_teams, event_times), per="frame")
+        record("add_stats_text", _time_frames(pltr.add_stats_text, event_times), per="frame")
+        record("add_teams_location", _time_frames(lambda t: pltr.add_teams_location(pltr.canvas_map, t), event_times), per="frame")
+        pltr.restore_dirty_rects()
+        record("add_teams_density", _time_frames(lambda t: pltr.add_teams_density(pltr.canvas_map, t), event_times), per="frame")
+        pltr.restore_dirty_rects()
+        record("render_frame", _time_frames(pltr.render_frame, event_times), per="frame")
+
+        return timings, event_store.memory_report(store)
+
+def _time_repeats(func, repeats: int) -> "tuple[list[float], object]":
+    """
+    Call func repeats times, returning the duration of each call and the last return value
+    """
+    durations = []
+    value = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = func()
+        durations.append(time.perf_counter() - start)
+    return durations, value
+
+def _time_frames(func, event_times: np.ndarray) -> "list[float]":
+    """
+    Call func once for each event time in order, returning the duration of each call
+    """
+    durations = []
+    for t_event in event_times:
+        start = time.perf_counter()
+        func(float(t_event))
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def _git_commit() -> "str | None":
+    """
+    Return the commit being benchmarked, if run from a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading and replaying synthetic events")
+    parser.add_argument("--scales", type=int, nargs="+", default=[50, 500, 5000], help="numbers of teams")
+    parser.add_argument("--repeats", type=int, default=3, help="repeats of each loading stage")
+    parser.add_argument("--frames", type=int, default=50, help="frames timed for each per frame stage")
+    parser.add_argument("--controls", type=int, default=50)
+    parser.add_argument("--map-size", type=int, default=4000, help="width and height of the map in pixels")
+    parser.add_argument("--output", type=Path, help="json file to write the report to, printed if not given")
+    args = parser.parse_args()
+
+    benchmark_report = Benchmark(args.scales, args.repeats, args.frames, args.controls, args.map_size).run()
+    report_json = json.dumps(benchmark_report, indent=2)
+    if args.output:
+        args.output.write_text(report_json)
+    else:
+        print(report_json)
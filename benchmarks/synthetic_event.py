@@ -0,0 +1,230 @@
+import argparse
+import csv
+import math
+from pathlib import Path
+import random
+
+import cv2
+import numpy as np
+import yaml
+
+from results_reader import results_reader
+
+class SyntheticEventGenerator:
+    """
+    Generate a realistic looking rogaine event in the navlight formats read by this program:
+    team result txt files, a control coordinates csv, leg and control statistics txt files and
+    the csv files converted from them, a map png and a config pointing at them all
+    """
+    def __init__(self, n_teams: int, n_controls: int = 50, map_size: int = 4000,
+                 event_length: float = 12.0, seed: int = 0):
+        # control ids are 2 digits, as expected by the statistics txt parsers
+        if not 1 <= n_controls <= 80:
+            raise ValueError("n_controls must be between 1 and 80")
+        self.n_teams = n_teams
+        self.n_controls = n_controls
+        self.map_size = map_size
+        self.event_length = event_length
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        # 1 km is 1/10th of the map width
+        self.pixels_per_km = map_size // 10
+
+    def generate(self, output_directory: Path) -> Path:
+        """
+        Write the event to output_directory and return the path of its config
+        """
+        output_directory = Path(output_directory)
+        results_directory = output_directory / "results"
+        results_directory.mkdir(parents=True, exist_ok=True)
+
+        control_coordinates = self._generate_control_coordinates()
+        self._write_control_coordinates(control_coordinates, output_directory / "control-coordinates.csv")
+        self._write_map(control_coordinates, output_directory / "map.png")
+
+        leg_counts = {}
+        visit_counts = {}
+        for team_number in range(1, self.n_teams + 1):
+            route = self._generate_route(control_coordinates)
+            self._write_team_result(team_number, route, control_coordinates, results_directory)
+            prev_control = "HH"
+            for control, _split_secs in route:
+                leg = f"{prev_control}:{control}"
+                leg_counts[leg] = leg_counts.get(leg, 0) + 1
+                if control != "HH":
+                    visit_counts[control] = visit_counts.get(control, 0) + 1
+                prev_control = control
+
+        leg_statistics_txt = output_directory / "leg-statistics.txt"
+        control_statistics_txt = output_directory / "control-statistics.txt"
+        self._write_statistics("Leg  Count", leg_counts, leg_statistics_txt)
+        self._write_statistics("Control  Visits", visit_counts, control_statistics_txt)
+        # the config points at the csv statistics, converted from the txt files as the event setup does
+        txt_rdr = results_reader.ResultsReader({"leg_statistics": str(leg_statistics_txt),
+                                                "control_statistics": str(control_statistics_txt)}, {})
+        txt_rdr.write_leg_statistics_csv(txt_rdr.parse_leg_statistics_txt(), output_directory)
+        txt_rdr.write_control_statistics_csv(txt_rdr.parse_control_statistics_txt(), output_directory)
+
+        config = {
+            "team_number": "1",
+            "event_length": self.event_length,
+            "results_directory": str(results_directory),
+            "map_file": str(output_directory / "map.png"),
+            "control_coordinates": str(output_directory / "control-coordinates.csv"),
+            "leg_statistics": str(output_directory / "leg-statistics.csv"),
+            "control_statistics": str(output_directory / "control-statistics.csv"),
+            "map_scale_pixels": f"{self.pixels_per_km}:1000",
+        }
+        config_path = output_directory / "config.yml"
+        with open(config_path, "w") as config_fp:
+            yaml.dump(config, config_fp)
+        return config_path
+
+    def _generate_control_coordinates(self) -> "dict[str, tuple[int, int]]":
+        """
+        Place HH near the middle of the map and the controls uniformly around it
+        """
+        margin = self.map_size // 20
+        centre = self.map_size // 2
+        control_coordinates = {"HH": (centre + self.rng.randint(-margin, margin), centre + self.rng.randint(-margin, margin))}
+        for control in self.rng.sample(range(20, 100), self.n_controls):
+            control_coordinates[str(control)] = (self.rng.randint(margin, self.map_size - margin),
+                                                 self.rng.randint(margin, self.map_size - margin))
+        return control_coordinates
+
+    def _generate_route(self, control_coordinates: "dict[str, tuple[int, int]]") -> "list[tuple[str, int]]":
+        """
+        Return a team's route as (control, split seconds), greedily visiting nearby high value
+        controls at the team's own pace until it has to head back to HH
+        """
+        speed_kmh = self.rng.uniform(2.5, 6.0)
+        event_secs = self.event_length * 3600
+        # some teams push their luck and come back late
+        time_budget = event_secs * self.rng.uniform(0.6, 1.04)
+
+        unvisited = [control for control in control_coordinates if control != "HH"]
+        route = []
+        curr_control = "HH"
+        elapsed = 0
+        while unvisited:
+            def leg_secs(control: str) -> int:
+                return self._leg_secs(control_coordinates[curr_control], control_coordinates[control], speed_kmh)
+
+            candidates = self.rng.sample(unvisited, min(5, len(unvisited)))
+            next_control = max(candidates, key=lambda control: (int(control) // 10) / (leg_secs(control) + 1))
+            split = leg_secs(next_control)
+            return_secs = self._leg_secs(control_coordinates[next_control], control_coordinates["HH"], speed_kmh)
+            if elapsed + split + return_secs > time_budget:
+                break
+
+            route.append((next_control, split))
+            elapsed += split
+            unvisited.remove(next_control)
+            curr_control = next_control
+
+        route.append(("HH", self._leg_secs(control_coordinates[curr_control], control_coordinates["HH"], speed_kmh)))
+        return route
+
+    def _leg_secs(self, start: "tuple[int, int]", end: "tuple[int, int]", speed_kmh: float) -> int:
+        """
+        Return the time in seconds to run between two points, with some route choice and terrain noise
+        """
+        dist_km = math.dist(start, end) / self.pixels_per_km
+        return max(60, int(dist_km / speed_kmh * 3600 * self.rng.uniform(1.1, 1.6)))
+
+    def _write_team_result(self, team_number: int, route: "list[tuple[str, int]]",
+                           control_coordinates: "dict[str, tuple[int, int]]", results_directory: Path) -> None:
+        """
+        Write a team's route as a navlight txt result
+        """
+        lines = [
+            f"Team {team_number}  Synthetic Team {team_number}\n",
+            "Category: MO\n",
+            "Start: 10:00:00\n",
+            "No  Control  Time      Dist  CmDist  Points  Split  Speed\n",
+        ]
+
+        points = 0
+        elapsed = 0
+        cumulative_dist = 0.0
+        prev_control = "HH"
+        for leg_num, (control, split_secs) in enumerate(route, start=1):
+            if control != "HH":
+                points += int(control) // 10 * 10
+            elapsed += split_secs
+            dist = math.dist(control_coordinates[prev_control], control_coordinates[control]) / self.pixels_per_km
+            cumulative_dist += dist
+            clock = _format_secs(10 * 3600 + elapsed)
+            split = _format_secs(split_secs)
+            # navlight drops the hours from splits under an hour
+            if split_secs < 3600:
+                split = split[2:]
+            speed = dist / (split_secs / 3600)
+            lines.append(f"{leg_num:>3}  {control:>7}  {clock}  {dist:4.1f}  {cumulative_dist:6.1f}  {points:>6}  {split:>8}  {speed:5.1f}\n")
+            prev_control = control
+
+        late_secs = elapsed - self.event_length * 3600
+        if late_secs > 0:
+            # 10 points per minute or part of a minute late
+            deduction = -10 * math.ceil(late_secs / 60)
+            lines.append(f"     Late Penalty  {deduction}\n")
+
+        lines.append("\n")
+        lines.append(f"Distance  {cumulative_dist:.1f} km\n")
+        (results_directory / f"{team_number}_result.txt").write_text("".join(lines))
+
+    def _write_control_coordinates(self, control_coordinates: "dict[str, tuple[int, int]]", filepath: Path) -> None:
+        """
+        Write the control coordinates csv in the format written by ControlCoordinatesReader
+        """
+        with open(filepath, "w") as coordinates_fp:
+            csvwriter = csv.writer(coordinates_fp)
+            csvwriter.writerow(["control", "pixel_x", "pixel_y"])
+            for control_id, (pixel_x, pixel_y) in control_coordinates.items():
+                csvwriter.writerow([control_id, pixel_x, pixel_y])
+
+    def _write_statistics(self, title: str, counts: "dict[str, int]", filepath: Path) -> None:
+        """
+        Write leg or control statistics as copied from the navlight statistics page
+        """
+        lines = [f"{title}\n"]
+        for key, count in sorted(counts.items(), key=lambda item: -item[1]):
+            lines.append(f"{key}  {count}\n")
+        filepath.write_text("".join(lines))
+
+    def _write_map(self, control_coordinates: "dict[str, tuple[int, int]]", filepath: Path) -> None:
+        """
+        Write a map png with smooth random terrain shading and contour lines
+        """
+        low_res = self.np_rng.random((32, 32)).astype(np.float32)
+        terrain = cv2.resize(low_res, (self.map_size, self.map_size), interpolation=cv2.INTER_CUBIC)
+        terrain = cv2.GaussianBlur(terrain, (0, 0), self.map_size / 100)
+        terrain = (terrain - terrain.min()) / max(float(terrain.max() - terrain.min()), 1e-6)
+
+        map_image = np.empty((self.map_size, self.map_size, 3), dtype=np.uint8)
+        map_image[:] = (200, 235, 245)
+        # green vegetation where the terrain is high
+        map_image[terrain > 0.6] = (160, 220, 170)
+        # brown contours every 1/12th of the terrain height
+        contours = np.abs((terrain * 12) % 1 - 0.5) < 0.04
+        map_image[contours] = (60, 110, 170)
+        cv2.imwrite(str(filepath), map_image)
+
+def _format_secs(secs: int) -> str:
+    """
+    Format a number of seconds as H:MM:SS
+    """
+    return f"{secs // 3600}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic rogaine event")
+    parser.add_argument("output_directory", type=Path)
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--controls", type=int, default=50)
+    parser.add_argument("--map-size", type=int, default=4000, help="width and height of the map in pixels")
+    parser.add_argument("--event-length", type=float, default=12.0, help="hours")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = SyntheticEventGenerator(args.teams, args.controls, args.map_size, args.event_length, args.seed)
+    print(generator.generate(args.output_directory))
@@ -0,0 +1,288 @@
+"""
+Non-interactive command line entry point, running the stages of processing an event without any dialogs
+
+usage: python3 cli.py <stage> <config.yml or event directory> [--force]
+
+Stages are skipped when their outputs exist and they last ran on the same input files, compared
+by name, size and modification time and then by content, unless --force is given. convert-results
+instead compares the txt results with its ingest manifest, so it always picks up files that are
+new, changed or removed
+Exit status is 0 on success, 1 if a stage failed and 2 for invalid arguments
+"""
+import argparse
+import json
+from pathlib import Path
+import sys
+import traceback
+
+import yaml
+
+from results_analytics import results_analytics
+from results_archive import results_archive
+from results_plotter import baked_trajectory
+from results_plotter import batch_renderer
+from results_plotter import video_exporter
+from results_reader import event_bundle
+from results_reader import results_reader
+import utils
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+STAGES = ["convert-results", "convert-stats", "bake", "export", "analytics"]
+# stages only run when asked for by name, not by all
+EXTRA_STAGES = ["batch", "archive"]
+
+def load_config(path: Path) -> "tuple[dict, Path]":
+    """
+    Load the config from a yaml file, or from config.yml in an event directory
+    Returns the config and the path it was loaded from
+    """
+    config_path = path / "config.yml" if path.is_dir() else path
+    with open(config_path, "r") as config_fp:
+        return yaml.safe_load(config_fp), config_path
+
+def stage_record_path(config: dict) -> Path:
+    """
+    Return the file recording the inputs each stage last ran on, in the results directory
+    """
+    return Path(config["results_directory"]) / "cli-stages.json"
+
+def is_up_to_date(config: dict, stage: str, inputs: "list[Path]", outputs: "list[Path]") -> bool:
+    """
+    Return whether every output exists and the stage last ran on the same inputs, the same set of
+    files with the same contents, as recorded by record_stage
+    """
+    if not outputs or not all(output.exists() for output in outputs):
+        return False
+    records = _load_stage_records(config)
+    if stage not in records:
+        return False
+
+    def refresh(fingerprint: "list[list]") -> None:
+        records[stage]["source_fingerprint"] = fingerprint
+        _write_stage_records(config, records)
+
+    return event_bundle.files_unchanged(records[stage], [path for path in inputs if path.exists()], refresh)
+
+def record_stage(config: dict, stage: str, inputs: "list[Path]") -> None:
+    """
+    Record the inputs a stage ran on, so is_up_to_date can skip it until they change
+    """
+    existing_inputs = [path for path in inputs if path.exists()]
+    records = _load_stage_records(config)
+    records[stage] = {
+        "source_fingerprint": event_bundle.files_fingerprint(existing_inputs),
+        "source_hash": event_bundle.files_hash(existing_inputs),
+    }
+    _write_stage_records(config, records)
+
+def _load_stage_records(config: dict) -> "dict[str, dict]":
+    """
+    Return the recorded inputs of each stage, as stage:record
+    """
+    record_path = stage_record_path(config)
+    if not record_path.exists():
+        return {}
+    return json.loads(record_path.read_text())
+
+def _write_stage_records(config: dict, records: "dict[str, dict]") -> None:
+    """
+    Write the recorded inputs of each stage
+    """
+    stage_record_path(config).write_text(json.dumps(records, indent=2))
+
+def txt_result_files(config: dict) -> "list[Path]":
+    """
+    Return the navlight txt result files in the results directory
+    """
+    return sorted(Path(config["results_directory"]).glob("*_*.txt"))
+
+def csv_result_files(config: dict) -> "list[Path]":
+    """
+    Return the csv result files written by convert-results
+    """
+    return sorted(Path(config["results_directory"]).glob("*_result.csv"))
+
+def convert_results(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Parse the txt results that are new or changed since the last run into csv files, and delete
+    the csv files of teams whose txt file was removed
+    Returns False if the stage was skipped as up to date
+    """
+    # the ingest manifest decides what is up to date, removing a txt file changes no input's
+    # modification time so an mtime check would miss it. --force parses every file again
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    _results, changed_teams, removed_teams = results_rdr.update_txt_results_directory(workers=args.workers,
+                                                                                      reparse=args.force)
+    if not changed_teams and not removed_teams:
+        return False
+    print(f"convert-results: parsed {len(changed_teams)} changed, dropped {len(removed_teams)} removed")
+    return True
+
+def convert_stats(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Write the leg and control statistics csv files named in the config, from the txt statistics
+    if given or calculated from the csv results otherwise
+    Returns False if the stage was skipped as up to date
+    """
+    leg_stats_path = Path(config["leg_statistics"])
+    control_stats_path = Path(config["control_statistics"])
+    stats_txt = [path for path in [args.leg_statistics_txt, args.control_statistics_txt] if path is not None]
+    inputs = stats_txt + csv_result_files(config) + [Path(config["control_coordinates"]), config_path]
+    if not args.force and is_up_to_date(config, "convert-stats", inputs, [leg_stats_path, control_stats_path]):
+        return False
+
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    results = None
+    if args.leg_statistics_txt is None or args.control_statistics_txt is None:
+        results = results_rdr.parse_csv_results_directory()
+
+    if args.leg_statistics_txt is not None:
+        txt_rdr = results_reader.ResultsReader({**config, "leg_statistics": str(args.leg_statistics_txt)}, {})
+        leg_stats = txt_rdr.parse_leg_statistics_txt()
+    else:
+        leg_stats = results_rdr.calculate_leg_statistics(results)
+
+    if args.control_statistics_txt is not None:
+        txt_rdr = results_reader.ResultsReader({**config, "control_statistics": str(args.control_statistics_txt)}, {})
+        control_stats = txt_rdr.parse_control_statistics_txt()
+    else:
+        control_stats = results_rdr.calculate_control_statistics(results)
+
+    leg_stats_path.parent.mkdir(parents=True, exist_ok=True)
+    control_stats_path.parent.mkdir(parents=True, exist_ok=True)
+    leg_stats.to_csv(leg_stats_path, index=False)
+    control_stats.to_csv(control_stats_path, index=False)
+    record_stage(config, "convert-stats", inputs)
+    return True
+
+def bake(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Bake every frame of the replay into the trajectory file played back by the replay
+    Returns False if the stage was skipped as up to date
+    """
+    trajectory = baked_trajectory.TrajectoryFile.for_config(config)
+    if not args.force and trajectory.is_current(config):
+        return False
+
+    baked_trajectory.bake_event(config)
+    return True
+
+def export(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Render the replay to the video or png sequence given by the export settings in the config
+    Returns False if the stage was skipped as up to date
+    """
+    inputs = csv_result_files(config) + [Path(config["map_file"]), Path(config["control_coordinates"]),
+                                         Path(config["leg_statistics"]), config_path]
+    if not args.force and is_up_to_date(config, "export", inputs, [video_exporter.export_path(config)]):
+        return False
+
+    video_exporter.export_event(config)
+    record_stage(config, "export", inputs)
+    return True
+
+def analytics(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Calculate leg timing and control visit statistics, and the pace and split tables and report of
+    every team, from the csv results into the analytics directory of the results directory
+    Returns False if the stage was skipped as up to date
+    """
+    analytics_dir = results_analytics.analytics_directory(config)
+    outputs = [analytics_dir / "leg-statistics.csv", analytics_dir / "control-statistics.csv",
+               analytics_dir / results_analytics.LEGS_FILENAME, analytics_dir / results_analytics.TEAMS_FILENAME,
+               analytics_dir / results_analytics.RANKS_FILENAME, analytics_dir / results_analytics.REPORT_FILENAME]
+    # the tables record the results and settings they were computed from
+    up_to_date = all(output.exists() for output in outputs) and results_analytics.is_current(analytics_dir, config)
+    if not args.force and up_to_date:
+        return False
+
+    analytics_dir.mkdir(parents=True, exist_ok=True)
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    results = results_rdr.parse_csv_results_directory()
+    results_rdr.write_leg_statistics_csv(results_rdr.calculate_leg_statistics(results), analytics_dir)
+    results_rdr.write_control_statistics_csv(results_rdr.calculate_control_statistics(results), analytics_dir)
+
+    event_analytics = results_analytics.analyse_event(config, results)
+    event_analytics.write(analytics_dir, config)
+    event_analytics.write_report(analytics_dir / results_analytics.REPORT_FILENAME)
+    return True
+
+def batch(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Export a replay for every team with that team as the focus, resuming any earlier batch
+    Returns False if every replay was already rendered
+    """
+    renderer = batch_renderer.BatchRenderer([config], workers=args.workers)
+    renderer.run()
+    print(renderer.summary())
+    return renderer.videos_rendered > 0
+
+def archive(config: dict, config_path: Path, args: argparse.Namespace) -> bool:
+    """
+    Add the event's txt results to the results archive given by --archive or config["results_archive"],
+    named by --event-name, config["event_name"] or the name of the config's directory
+    """
+    archive_path = args.archive or config.get("results_archive")
+    if archive_path is None:
+        raise ValueError("No results archive given, pass --archive or set results_archive in the config")
+    event_name = args.event_name or config.get("event_name") or config_path.resolve().parent.name
+    results_archive.archive_event(Path(archive_path), event_name, config)
+    return True
+
+STAGE_FUNCTIONS = {
+    "convert-results": convert_results,
+    "convert-stats": convert_stats,
+    "bake": bake,
+    "export": export,
+    "analytics": analytics,
+    "batch": batch,
+    "archive": archive,
+}
+
+def parse_args(argv: "list[str]") -> argparse.Namespace:
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Process a rogaine event without the GUI")
+    parser.add_argument("stage", choices=STAGES + EXTRA_STAGES + ["all"], help="stage to run, all runs every stage in order")
+    parser.add_argument("event", type=Path, help="config yaml, or event directory containing config.yml")
+    parser.add_argument("--force", action="store_true", help="run stages even if their outputs are up to date")
+    parser.add_argument("--workers", type=int, help="processes to parse txt results or render batch replays with")
+    parser.add_argument("--leg-statistics-txt", type=Path, help="navlight leg statistics txt for convert-stats")
+    parser.add_argument("--control-statistics-txt", type=Path, help="navlight control statistics txt for convert-stats")
+    parser.add_argument("--archive", type=Path, help="sqlite results archive for the archive stage")
+    parser.add_argument("--event-name", help="name of the event in the results archive")
+    return parser.parse_args(argv)
+
+def main(argv: "list[str]") -> int:
+    """
+    Run the stage given on the command line, or every stage in order for all
+    Returns the exit status
+    """
+    args = parse_args(argv)
+    try:
+        config, config_path = load_config(args.event)
+    except (OSError, yaml.YAMLError) as error:
+        print(f"Unable to load config from {args.event}: {error}", file=sys.stderr)
+        return EXIT_USAGE
+
+    stages = STAGES if args.stage == "all" else [args.stage]
+    for stage in stages:
+        try:
+            ran = STAGE_FUNCTIONS[stage](config, config_path, args)
+        except Exception:
+            print(f"{stage}: failed", file=sys.stderr)
+            traceback.print_exc()
+            return EXIT_FAILED
+        print(f"{stage}: {'done' if ran else 'up to date, skipped'}")
+
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,15 +1,17 @@
 from user_interface import user_interface
 
-ui = user_interface.UserGui()
-ui.show_homepage()
-response = ui.show_config_prompt()
+if __name__ == "__main__":
+    # guarded, as the results are parsed in worker processes that import this module when spawned
+    ui = user_interface.UserGui()
+    ui.show_homepage()
+    response = ui.show_config_prompt()
 
-if response == "Create Config":
-    ui.show_create_config_option()
-    ui.save_config()
+    if response == "Create Config":
+        ui.show_create_config_option()
+        ui.save_config()
 
-elif response == "Load Config":
-    ui.show_load_config_option()
+    elif response == "Load Config":
+        ui.show_load_config_option()
 
-ui.replay_event()
-# ui.display_leg_stats()
+    ui.replay_event()
+    # ui.display_leg_stats()
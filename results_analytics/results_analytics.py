@@ -0,0 +1,343 @@
+import json
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from results_reader import event_bundle
+from results_reader import event_store
+from results_reader import results_reader
+import utils
+
+LEGS_FILENAME = "team-legs.csv"
+TEAMS_FILENAME = "team-summary.csv"
+RANKS_FILENAME = "rank-over-time.csv"
+REPORT_FILENAME = "report.txt"
+SOURCES_FILENAME = "analytics-sources.json"
+
+class ResultsAnalytics:
+    """
+    Pace and split analytics of every team in an event, as three tables:
+    - legs: every leg run by every team, with its split, straight line speed and the team's split
+      rank among every team that ran the same leg in the same direction
+    - teams: each team's final points, points per hour, average speed and final rank
+    - ranks: each team's points and rank every interval seconds through the event
+
+    The tables are computed for all teams at once from an EventStore, and can be written to and
+    read back from csv files, so the stats window, the report and the cli all read the same tables.
+    The replay only reads the legs table, so teams and ranks are None when only it was loaded
+    """
+    def __init__(self, legs: pd.DataFrame,
+                 teams: "pd.DataFrame | None" = None,
+                 ranks: "pd.DataFrame | None" = None):
+        self.legs = legs
+        self.teams = teams
+        self.ranks = ranks
+
+        # rows of each team's legs, which are stored team by team in leg order
+        team_numbers = legs.team_number.to_numpy()
+        starts = np.flatnonzero(np.r_[True, team_numbers[1:] != team_numbers[:-1]]) if len(legs) else np.zeros(0, dtype=np.int64)
+        stops = np.r_[starts[1:], len(legs)]
+        self.team_legs = {team_numbers[start]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+        self.arrival_secs = legs.arrival_secs.to_numpy(dtype=np.float64)
+        self.speed_kmh = legs.speed_kmh.to_numpy(dtype=np.float64)
+        self.split_rank = legs.split_rank.to_numpy(dtype=np.int64)
+        self.leg_count = legs.leg_count.to_numpy(dtype=np.int64)
+
+    @classmethod
+    def from_store(cls, store: event_store.EventStore, event_length: float, interval: float = 300) -> "ResultsAnalytics":
+        """
+        Compute every table from an event's results
+
+        args:
+        - store: EventStore of every team's result
+        - event_length: float representing the length of the event in hours
+        - interval: seconds between samples of the rank over time table
+        """
+        return cls(_legs_table(store), _teams_table(store), _ranks_table(store, event_length, interval))
+
+    @classmethod
+    def legs_from_store(cls, store: event_store.EventStore) -> "ResultsAnalytics":
+        """
+        Compute only the legs table from an event's results, all the replay's stats window reads
+        """
+        return cls(_legs_table(store))
+
+    @classmethod
+    def for_config(cls, config: dict, store: event_store.EventStore) -> "ResultsAnalytics":
+        """
+        Compute every table from an event's results, with the event length and sample interval in config
+        """
+        return cls.from_store(store, float(config["event_length"]), float(config.get("analytics_interval", 300)))
+
+    @classmethod
+    def for_replay(cls, config: dict, store: "event_store.EventStore | None" = None) -> "ResultsAnalytics | None":
+        """
+        Return the legs table read by the replay's stats window, from the analytics directory if its
+        tables are current, otherwise computed from store
+        None if the tables aren't current and there is no store to compute them from
+        """
+        directory = analytics_directory(config)
+        if is_current(directory, config):
+            return cls.load(directory, legs_only=True)
+        if store is None:
+            return None
+        return cls.legs_from_store(store)
+
+    @classmethod
+    def load(cls, directory: Path, legs_only: bool = False) -> "ResultsAnalytics":
+        """
+        Read the tables written by write from directory, only the legs table if legs_only
+        """
+        directory = Path(directory)
+        text_columns = {"team_number": str, "from_control": str, "to_control": str}
+        legs = pd.read_csv(directory / LEGS_FILENAME, dtype=text_columns)
+        if legs_only:
+            return cls(legs)
+        return cls(legs,
+                   pd.read_csv(directory / TEAMS_FILENAME, dtype=text_columns),
+                   pd.read_csv(directory / RANKS_FILENAME, dtype=text_columns))
+
+    def write(self, directory: Path, config: "dict | None" = None) -> None:
+        """
+        Write the tables to csv files in directory, and if given the config of the event record the
+        results and settings they were computed from so is_current can tell when they are stale
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.legs.to_csv(directory / LEGS_FILENAME, index=False)
+        self.teams.to_csv(directory / TEAMS_FILENAME, index=False)
+        self.ranks.to_csv(directory / RANKS_FILENAME, index=False)
+        if config is not None:
+            _write_sources(directory, config, event_bundle.source_hash(config))
+
+    def last_leg(self, team_number: str, t_event: float) -> "tuple[float, int, int] | None":
+        """
+        Return the straight line speed in km/h of the last leg a team finished before t_event, its
+        split rank on that leg and the number of teams that ran it, None if it hasn't finished a leg
+
+        args:
+        - team_number: str representing the team
+        - t_event: float representing seconds elapsed since start of the event
+        """
+        rows = self.team_legs.get(team_number)
+        if rows is None:
+            return None
+        start, stop = rows
+        finished = int(np.searchsorted(self.arrival_secs[start:stop], t_event, side="left"))
+        if finished == 0:
+            return None
+        leg_row = start + finished - 1
+        return float(self.speed_kmh[leg_row]), int(self.split_rank[leg_row]), int(self.leg_count[leg_row])
+
+    def leg_summary(self) -> pd.DataFrame:
+        """
+        Return each leg run by any team, with the number of teams that ran it, the median speed,
+        and the fastest team and split, most run legs first
+        """
+        legs_by_leg = self.legs.groupby(["from_control", "to_control"], sort=False)
+        fastest = self.legs.loc[legs_by_leg.split_secs.idxmin()]
+        summary = pd.DataFrame({
+            "leg": fastest.from_control + ":" + fastest.to_control,
+            "leg_count": fastest.leg_count,
+            "median_speed_kmh": legs_by_leg.speed_kmh.median().to_numpy(),
+            "fastest_team": fastest.team_number,
+            "fastest_split_secs": fastest.split_secs,
+        })
+        return summary.sort_values(["leg_count", "leg"], ascending=[False, True]).reset_index(drop=True)
+
+    def report_text(self, top_count: int = 20) -> str:
+        """
+        Return a plain text report of the top teams by points and points per hour, and the most
+        run legs
+        """
+        team_columns = ["final_rank", "team_number", "final_points", "points_per_hour", "average_speed_kmh"]
+        by_points = self.teams.sort_values(["final_rank", "team_number"])[team_columns].head(top_count)
+        by_rate = self.teams.sort_values("points_per_hour", ascending=False)[team_columns].head(top_count)
+        float_format = "{:.1f}".format
+        return "\n\n".join([
+            "Final standings\n" + by_points.to_string(index=False, float_format=float_format),
+            "Points per hour\n" + by_rate.to_string(index=False, float_format=float_format),
+            "Most run legs\n" + self.leg_summary().head(top_count).to_string(index=False, float_format=float_format),
+        ]) + "\n"
+
+    def write_report(self, path: Path, top_count: int = 20) -> None:
+        """
+        Write the report to a text file
+        """
+        Path(path).write_text(self.report_text(top_count))
+
+def analytics_directory(config: dict) -> Path:
+    """
+    Return the directory the analytics tables of the event described by config are written to
+    """
+    return Path(config["results_directory"]) / "analytics"
+
+def is_current(directory: Path, config: dict) -> bool:
+    """
+    Return whether the tables in directory were written from the current results and settings
+    """
+    sources_path = Path(directory) / SOURCES_FILENAME
+    if not sources_path.exists() or not (Path(directory) / LEGS_FILENAME).exists():
+        return False
+
+    sources = json.loads(sources_path.read_text())
+    if sources["settings"] != analytics_settings(config):
+        return False
+    return event_bundle.sources_unchanged(
+        sources, config, lambda fingerprint: _write_sources(directory, config, sources["source_hash"], fingerprint))
+
+def analytics_settings(config: dict) -> dict:
+    """
+    Return the settings of config that the tables depend on
+    """
+    return {
+        "event_length": float(config["event_length"]),
+        "analytics_interval": float(config.get("analytics_interval", 300)),
+    }
+
+def _write_sources(directory: Path, config: dict, source_hash: str,
+                   fingerprint: "list[list] | None" = None) -> None:
+    """
+    Record the results and settings the tables in directory were computed from
+    """
+    sources = {
+        "source_fingerprint": fingerprint if fingerprint is not None else event_bundle.source_fingerprint(config),
+        "source_hash": source_hash,
+        "settings": analytics_settings(config),
+    }
+    (Path(directory) / SOURCES_FILENAME).write_text(json.dumps(sources))
+
+def _legs_table(store: event_store.EventStore) -> pd.DataFrame:
+    """
+    Return every leg run by every team, team by team in leg order
+    """
+    n_teams = len(store.team_numbers)
+    team_lengths = np.diff(store.team_offsets)
+    team_of_row = np.repeat(np.arange(n_teams), team_lengths)
+    team_numbers = np.array(store.team_numbers, dtype=object)
+
+    # each team starts its first leg from HH, late penalty rows don't move and aren't legs
+    curr = store.control_id.astype(np.int64)
+    prev = np.roll(curr, 1)
+    team_starts = store.team_offsets[:-1][team_lengths > 0]
+    prev[team_starts] = store.control_ids["HH"]
+    leg_num = np.arange(len(curr)) - np.repeat(store.team_offsets[:-1], team_lengths) + 1
+    moved = prev != curr
+
+    split_secs = store.time_split_ms[moved] / 1000
+    distance = store.distance[moved]
+    speed_kmh = np.divide(distance * 3600, split_secs, out=np.full(len(split_secs), np.nan), where=split_secs > 0)
+    legs = pd.DataFrame({
+        "team_number": team_numbers[team_of_row[moved]],
+        "leg_num": leg_num[moved],
+        "from_control": store.control_names[prev[moved]],
+        "to_control": store.control_names[curr[moved]],
+        "arrival_secs": store.cumulative_time_ms[moved] / 1000,
+        "split_secs": split_secs,
+        "distance_km": distance,
+        "speed_kmh": speed_kmh,
+        "cumulative_points": store.cumulative_points[moved].astype(np.int64),
+    })
+    legs_by_leg = legs.split_secs.groupby(prev[moved] * len(store.controls) + curr[moved])
+    legs["split_rank"] = legs_by_leg.rank(method="min").to_numpy(dtype=np.int64)
+    legs["leg_count"] = legs_by_leg.transform("size").to_numpy(dtype=np.int64)
+    return legs
+
+def _teams_table(store: event_store.EventStore) -> pd.DataFrame:
+    """
+    Return each team's final points, points per hour, average speed and final rank
+    """
+    n_teams = len(store.team_numbers)
+    team_lengths = np.diff(store.team_offsets)
+    team_numbers = np.array(store.team_numbers, dtype=object)
+
+    # a team's final standing is its last row, penalties included, padded with a row of zeros
+    # for teams without a result
+    last_rows = np.where(team_lengths > 0, store.team_offsets[1:], 0)
+    final_points = _padded(store.cumulative_points)[last_rows].astype(np.int64)
+    total_secs = _padded(store.cumulative_time_ms)[last_rows] / 1000
+    total_distance = _padded(store.cumulative_distance)[last_rows]
+    total_hours = total_secs / 3600
+    teams = pd.DataFrame({
+        "team_number": team_numbers,
+        "final_points": final_points,
+        "total_secs": total_secs,
+        "total_distance_km": total_distance,
+        "points_per_hour": np.divide(final_points, total_hours, out=np.zeros(n_teams), where=total_hours > 0),
+        "average_speed_kmh": np.divide(total_distance, total_hours, out=np.zeros(n_teams), where=total_hours > 0),
+        "final_rank": _competition_ranks(final_points[None, :])[0],
+    })
+    return teams
+
+def _ranks_table(store: event_store.EventStore, event_length: float, interval: float) -> pd.DataFrame:
+    """
+    Return each team's points and rank every interval seconds through an event lasting event_length hours
+    """
+    n_teams = len(store.team_numbers)
+    team_numbers = np.array(store.team_numbers, dtype=object)
+    sample_secs = np.arange(0, (event_length + 0.5) * 3600 + interval, interval)
+    points = _points_at(store, sample_secs)
+    ranks = pd.DataFrame({
+        "t_secs": np.repeat(sample_secs, n_teams),
+        "team_number": np.tile(team_numbers, len(sample_secs)),
+        "points": points.reshape(-1),
+        "rank": _competition_ranks(points).reshape(-1),
+    })
+    return ranks
+
+def _points_at(store: event_store.EventStore, sample_secs: np.ndarray) -> np.ndarray:
+    """
+    Return an (n_samples, n_teams) array of each team's points after the controls it reached
+    before each sample time
+    """
+    n_teams = len(store.team_numbers)
+    team_lengths = np.diff(store.team_offsets)
+    # one search over keys sorted by team then time, as in PositionEngine
+    cumulative_time_ms = store.cumulative_time_ms.astype(np.int64)
+    sample_ms = (sample_secs * 1000).astype(np.int64)
+    key_stride = max(int(cumulative_time_ms.max(initial=0)), int(sample_ms.max(initial=0))) + 2
+    team_base = np.arange(n_teams, dtype=np.int64) * key_stride
+    search_keys = np.repeat(team_base, team_lengths) + cumulative_time_ms
+    reached_count = np.searchsorted(search_keys, team_base[None, :] + sample_ms[:, None], side="left") - store.team_offsets[:-1]
+
+    point_rows = np.where(reached_count > 0, store.team_offsets[:-1] + reached_count, 0)
+    return _padded(store.cumulative_points).astype(np.int64)[point_rows]
+
+def _padded(column: np.ndarray) -> np.ndarray:
+    """
+    Return a column with a row of zero before it, so row r of the column is row r + 1
+    """
+    return np.concatenate([np.zeros(1, dtype=column.dtype), column])
+
+def _competition_ranks(points: np.ndarray) -> np.ndarray:
+    """
+    Return the rank of each team in each row of an (n_rows, n_teams) array of points, one more than
+    the number of teams in the same row with more points, so tied teams share a rank
+    """
+    n_rows, n_teams = points.shape
+    if n_teams == 0:
+        return np.zeros(points.shape, dtype=np.int64)
+    # offset each row so a single search over all rows stays sorted
+    shifted = points - points.min()
+    row_stride = int(shifted.max()) + 1
+    row_idx = np.arange(n_rows, dtype=np.int64)[:, None]
+    sorted_keys = (np.sort(shifted, axis=1) + row_idx * row_stride).reshape(-1)
+    at_or_below = np.searchsorted(sorted_keys, shifted + row_idx * row_stride, side="right") - row_idx * n_teams
+    return n_teams - at_or_below + 1
+
+def analyse_event(config: dict, results: "dict[str, pd.Dataframe] | None" = None) -> ResultsAnalytics:
+    """
+    Compute the analytics of the event described by config, from its csv results unless given
+    """
+    control_coords = utils.get_control_coordinates(config)
+    if results is None:
+        results = results_reader.ResultsReader(config, control_coords).parse_csv_results_directory()
+    return ResultsAnalytics.for_config(config, event_store.EventStore.from_results(results, control_coords))
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "r") as config_fp:
+        event_config = yaml.safe_load(config_fp)
+    print(analyse_event(event_config).report_text())
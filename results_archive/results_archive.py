@@ -0,0 +1,258 @@
+import argparse
+from pathlib import Path
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from results_reader import results_reader
+import utils
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    event_length REAL,
+    results_directory TEXT
+);
+CREATE TABLE IF NOT EXISTS controls (
+    control_id INTEGER PRIMARY KEY,
+    code TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teams (
+    event_id INTEGER NOT NULL REFERENCES events(event_id),
+    team_number TEXT NOT NULL,
+    team_name TEXT,
+    final_points INTEGER NOT NULL,
+    total_secs INTEGER NOT NULL,
+    PRIMARY KEY (event_id, team_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS splits (
+    event_id INTEGER NOT NULL REFERENCES events(event_id),
+    team_number TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    prev_control_id INTEGER NOT NULL REFERENCES controls(control_id),
+    control_id INTEGER NOT NULL REFERENCES controls(control_id),
+    cumulative_points INTEGER NOT NULL,
+    split_secs INTEGER NOT NULL,
+    cumulative_secs INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    PRIMARY KEY (event_id, team_number, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS splits_by_leg ON splits (prev_control_id, control_id, event_id);
+CREATE INDEX IF NOT EXISTS splits_by_control ON splits (control_id, event_id);
+CREATE INDEX IF NOT EXISTS teams_by_number ON teams (team_number, event_id);
+CREATE INDEX IF NOT EXISTS teams_by_name ON teams (team_name, event_id);
+"""
+
+class ResultsArchive:
+    """
+    Results of many events in a single SQLite database, for looking at teams and legs across events
+
+    Every split of every team is a row, indexed by event, team, control and leg, so queries read
+    only the rows they need instead of loading whole events
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """
+        Close the connection to the database
+        """
+        self.connection.close()
+
+    def add_event(self, name: str,
+                  config: dict,
+                  results: "dict[str, pd.Dataframe]",
+                  team_names: "dict[str, str] | None" = None) -> None:
+        """
+        Add the results of an event, as returned by ResultsReader.parse_txt_results_directory,
+        replacing any event already archived under the same name
+
+        args:
+        - name: str identifying the event, e.g. "2023 NSW Champs"
+        - config: dict of the event config
+        - results: dict of team_number:result for every team
+        - team_names: dict of team_number:team name, if known
+        """
+        team_names = team_names or {}
+        with self.connection:
+            self._delete_event(name)
+            cursor = self.connection.execute(
+                "INSERT INTO events (name, event_length, results_directory) VALUES (?, ?, ?)",
+                (name, config.get("event_length"), str(config.get("results_directory", ""))))
+            event_id = cursor.lastrowid
+
+            control_ids = self._control_ids({"HH"}.union(*(set(result.control) for result in results.values())))
+
+            # build the rows of every team at once from a single frame of all results
+            team_numbers = list(results.keys())
+            team_lengths = np.array([len(result) for result in results.values()], dtype=np.int64)
+            team_starts = np.concatenate([[0], np.cumsum(team_lengths)[:-1]]).astype(np.int64)
+            frames = list(results.values())
+            all_results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["control"])
+
+            controls = all_results.control.map(control_ids).to_numpy(dtype=np.int64)
+            prev_controls = np.roll(controls, 1)
+            prev_controls[team_starts[team_lengths > 0]] = control_ids["HH"]
+            seqs = np.arange(len(controls)) - np.repeat(team_starts, team_lengths)
+            split_secs = _to_seconds(all_results.time_split)
+            cumulative_secs = _to_seconds(all_results.cumulative_time)
+            cumulative_points = all_results.cumulative_points.to_numpy(dtype=np.int64)
+
+            split_rows = zip([event_id] * len(controls), np.repeat(team_numbers, team_lengths).tolist(),
+                             seqs.tolist(), prev_controls.tolist(), controls.tolist(), cumulative_points.tolist(),
+                             split_secs.tolist(), cumulative_secs.tolist(), all_results.distance.tolist())
+
+            last_rows = team_starts + team_lengths - 1
+            has_rows = team_lengths > 0
+            team_rows = [(event_id, team_number, team_names.get(team_number),
+                          int(cumulative_points[last_row]) if has_row else 0,
+                          int(cumulative_secs[last_row]) if has_row else 0)
+                         for team_number, last_row, has_row in zip(team_numbers, last_rows.tolist(), has_rows.tolist())]
+
+            self.connection.executemany("INSERT INTO teams VALUES (?, ?, ?, ?, ?)", team_rows)
+            self.connection.executemany("INSERT INTO splits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", split_rows)
+
+    def remove_event(self, name: str) -> None:
+        """
+        Remove an event and all its results from the archive
+        """
+        with self.connection:
+            self._delete_event(name)
+
+    def events(self) -> "list[tuple[str, float, int]]":
+        """
+        Return every archived event as (name, event length in hours, number of teams)
+        """
+        return self.connection.execute("""
+            SELECT events.name, events.event_length, COUNT(teams.team_number)
+            FROM events LEFT JOIN teams USING (event_id)
+            GROUP BY events.event_id ORDER BY events.event_id
+        """).fetchall()
+
+    def leg_splits(self, from_control: str, to_control: str) -> "list[tuple[str, str, int]]":
+        """
+        Return every time a team ran the leg from_control to to_control, as
+        (event name, team number, split secs), fastest first
+        """
+        return self.connection.execute("""
+            SELECT events.name, splits.team_number, splits.split_secs
+            FROM splits
+            JOIN controls AS prev ON prev.control_id = splits.prev_control_id
+            JOIN controls AS curr ON curr.control_id = splits.control_id
+            JOIN events USING (event_id)
+            WHERE prev.code = ? AND curr.code = ?
+            ORDER BY splits.split_secs
+        """, (from_control, to_control)).fetchall()
+
+    def team_points_by_event(self, team_number: "str | None" = None,
+                             team_name: "str | None" = None) -> "list[tuple[str, str, int, int]]":
+        """
+        Return a team's final points in every event, matched by team number or team name, as
+        (event name, team number, final points, overall position)
+        """
+        if (team_number is None) == (team_name is None):
+            raise ValueError("Give exactly one of team_number or team_name")
+        # names are archived with single spaces, as returned by ResultsReader.parse_txt_team_names
+        column, value = ("team_number", team_number) if team_number is not None else ("team_name", " ".join(team_name.split()))
+        # position is one more than the number of teams in the same event with more points
+        return self.connection.execute(f"""
+            SELECT events.name, teams.team_number, teams.final_points,
+                   (SELECT COUNT(*) FROM teams AS other
+                    WHERE other.event_id = teams.event_id AND other.final_points > teams.final_points) + 1
+            FROM teams JOIN events USING (event_id)
+            WHERE teams.{column} = ?
+            ORDER BY events.event_id
+        """, (value,)).fetchall()
+
+    def control_visits(self, control: str) -> "list[tuple[str, int]]":
+        """
+        Return the number of visits to a control in each event, as (event name, visits)
+        """
+        return self.connection.execute("""
+            SELECT events.name, COUNT(*)
+            FROM splits
+            JOIN controls USING (control_id)
+            JOIN events USING (event_id)
+            WHERE controls.code = ?
+            GROUP BY splits.event_id ORDER BY splits.event_id
+        """, (control,)).fetchall()
+
+    def _control_ids(self, controls: "set[str]") -> "dict[str, int]":
+        """
+        Return the id of each control code, adding any not yet in the archive
+        """
+        self.connection.executemany("INSERT OR IGNORE INTO controls (code) VALUES (?)",
+                                    [(control,) for control in sorted(controls)])
+        return dict(self.connection.execute("SELECT code, control_id FROM controls").fetchall())
+
+    def _delete_event(self, name: str) -> None:
+        """
+        Delete an event and its rows, within the caller's transaction
+        """
+        row = self.connection.execute("SELECT event_id FROM events WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return
+        self.connection.execute("DELETE FROM splits WHERE event_id = ?", row)
+        self.connection.execute("DELETE FROM teams WHERE event_id = ?", row)
+        self.connection.execute("DELETE FROM events WHERE event_id = ?", row)
+
+def _to_seconds(column: pd.Series) -> np.ndarray:
+    """
+    Convert a timedelta column to int64 whole seconds
+    """
+    return column.to_numpy().astype("timedelta64[s]").astype(np.int64)
+
+def archive_event(archive_path: Path, name: str, config: dict) -> None:
+    """
+    Parse the txt results of the event described by config and add them to the archive
+    """
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    results = results_rdr.parse_txt_results_directory()
+    team_names = results_rdr.parse_txt_team_names()
+
+    archive = ResultsArchive(archive_path)
+    try:
+        archive.add_event(name, config, results, team_names)
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive event results and query them across events")
+    parser.add_argument("archive", type=Path, help="sqlite database file, created if it doesn't exist")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="archive the txt results of an event")
+    add_parser.add_argument("config", type=Path)
+    add_parser.add_argument("--name", help="name of the event, defaults to the config's directory name")
+    leg_parser = subparsers.add_parser("leg", help="every split of a leg across events")
+    leg_parser.add_argument("from_control")
+    leg_parser.add_argument("to_control")
+    team_parser = subparsers.add_parser("team", help="a team's points in every event")
+    team_parser.add_argument("team", help="team number, or team name with --name")
+    team_parser.add_argument("--name", action="store_true", help="match the team by name")
+    subparsers.add_parser("events", help="every archived event")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        with open(args.config, "r") as config_fp:
+            event_config = yaml.safe_load(config_fp)
+        archive_event(args.archive, args.name or args.config.resolve().parent.name, event_config)
+    else:
+        results_archive = ResultsArchive(args.archive)
+        if args.command == "leg":
+            rows = results_archive.leg_splits(args.from_control, args.to_control)
+        elif args.command == "team":
+            rows = (results_archive.team_points_by_event(team_name=args.team) if args.name
+                    else results_archive.team_points_by_event(team_number=args.team))
+        else:
+            rows = results_archive.events()
+        for row in rows:
+            print(*row, sep="\t")
+        results_archive.close()
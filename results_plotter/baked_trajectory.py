@@ -0,0 +1,265 @@
+import copy
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from results_plotter import leaderboard
+from results_plotter import position_engine
+from results_reader import event_bundle
+from results_reader import results_reader
+from utils import PixelCoordinate
+import utils
+
+class TrajectoryFile:
+    """
+    Every team's position, points, rank and distance sampled at every frame of the replay, baked
+    into (frames x teams) arrays in a single file that is memory mapped when played back
+
+    Playing back from the file needs no results, pandas or leaderboard updates, and only the
+    frames shown are paged in from disk. The file records the source files and replay settings it
+    was baked from, so it can be rebaked when any of them change
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def for_config(cls, config: dict) -> "TrajectoryFile":
+        """
+        Return the trajectory file for the event described by config, by default stored in the results directory
+        """
+        default_path = Path(config["results_directory"]) / "trajectory.bin"
+        return cls(config.get("trajectory_file", default_path))
+
+    def is_current(self, config: dict) -> bool:
+        """
+        Return whether the file exists and was baked from the current source files and replay settings
+        """
+        if not self.path.exists():
+            return False
+
+        header = event_bundle.read_array_header(self.path)
+        if header["replay_settings"] != replay_settings(config):
+            return False
+        return event_bundle.sources_unchanged(
+            header, config, lambda fingerprint: event_bundle.refresh_source_fingerprint(self.path, fingerprint))
+
+    def bake(self, config: dict,
+             results: "dict[str, pd.Dataframe]",
+             control_coordinates: "dict[str, PixelCoordinate]") -> None:
+        """
+        Sample the replay at every frame and write the arrays to the file
+        """
+        engine = position_engine.PositionEngine(results, control_coordinates)
+        standings = leaderboard.Leaderboard(engine, config["team_number"])
+        settings = replay_settings(config)
+        n_frames = int(settings["replay_duration"] * settings["fps"])
+        frame_times = np.arange(n_frames) / event_frames_per_sec(settings)
+        n_teams = len(engine.team_numbers)
+
+        # smallest integer types that hold every value
+        max_coordinate = max(engine.x.max(initial=0), engine.y.max(initial=0))
+        coordinate_dtype = np.int16 if max_coordinate < np.iinfo(np.int16).max else np.int32
+        rank_dtype = np.int16 if n_teams < np.iinfo(np.int16).max else np.int32
+
+        x = np.empty((n_frames, n_teams), dtype=coordinate_dtype)
+        y = np.empty((n_frames, n_teams), dtype=coordinate_dtype)
+        points = np.empty((n_frames, n_teams), dtype=np.int32)
+        rank = np.empty((n_frames, n_teams), dtype=rank_dtype)
+        distance = np.empty((n_frames, n_teams), dtype=np.float32)
+        positions_from_first = np.arange(1, n_teams + 1)
+
+        for frame_num, t_event in enumerate(frame_times.tolist()):
+            positions = engine.positions(t_event)
+            x[frame_num] = positions[:, 0]
+            y[frame_num] = positions[:, 1]
+            reached_rows = engine.reached_rows(t_event)
+            points[frame_num] = engine.cumulative_points[reached_rows]
+            distance[frame_num] = engine.cumulative_distance[reached_rows]
+
+            # teams in leaderboard order are their slots from highest to lowest
+            standings.seek(t_event)
+            order = np.argsort(standings.team_slot)[::-1]
+            rank[frame_num, order] = positions_from_first
+
+        header = {
+            "source_fingerprint": event_bundle.source_fingerprint(config),
+            "source_hash": event_bundle.source_hash(config),
+            "replay_settings": settings,
+            "team_numbers": engine.team_numbers,
+        }
+        arrays = {"x": x, "y": y, "points": points, "rank": rank, "distance": distance}
+        event_bundle.write_array_file(self.path, header, arrays)
+
+    def load(self, focus_team: str, top_count: int = 3) -> "tuple[BakedPositions, BakedLeaderboard]":
+        """
+        Memory map the file, returning stand ins for the PositionEngine and Leaderboard of the event
+        """
+        header, arrays = event_bundle.read_array_file(self.path)
+        baked_positions = BakedPositions(header, arrays)
+        return baked_positions, BakedLeaderboard(baked_positions, focus_team, top_count)
+
+class BakedPositions:
+    """
+    Team positions and distances looked up from baked frames, in place of a PositionEngine
+
+    Positions are interpolated between the two frames either side of the event time, so slowed
+    down playback stays smooth
+    """
+    def __init__(self, header: dict, arrays: "dict[str, np.ndarray]"):
+        self.team_numbers = header["team_numbers"]
+        self.team_index = {team: idx for idx, team in enumerate(self.team_numbers)}
+        self.x = arrays["x"]
+        self.y = arrays["y"]
+        self.points = arrays["points"]
+        self.rank = arrays["rank"]
+        self.distance = arrays["distance"]
+        self.n_frames = len(self.x)
+        self.frames_per_event_sec = event_frames_per_sec(header["replay_settings"])
+
+    def frame_of(self, t_event: float) -> "tuple[int, float]":
+        """
+        Return the last frame at or before t_event, and how far t_event is towards the next frame
+        """
+        frame_pos = min(max(t_event * self.frames_per_event_sec, 0.0), self.n_frames - 1)
+        # times of baked frames can come back a rounding error short of their frame
+        frame_num = int(frame_pos + 1e-6)
+        return frame_num, max(frame_pos - frame_num, 0.0)
+
+    def positions(self, t_event: float) -> np.ndarray:
+        """
+        Return an (n_teams, 2) array of each team's pixel position at time t_event,
+        in the same order as team_numbers
+        """
+        frame_num, frame_frac = self.frame_of(t_event)
+        next_frame = min(frame_num + 1, self.n_frames - 1)
+        positions = np.empty((len(self.team_numbers), 2), dtype=np.int64)
+        for axis, coordinates in enumerate((self.x, self.y)):
+            current = coordinates[frame_num].astype(np.float64)
+            positions[:, axis] = np.rint(current + (coordinates[next_frame] - current) * frame_frac)
+        return positions
+
+    def distance_of(self, team_number: str, t_event: float) -> float:
+        """
+        Return a single team's cumulative straight line distance in km at time t_event,
+        0 if the team has no result
+        """
+        team_idx = self.team_index.get(team_number)
+        if team_idx is None:
+            return 0.0
+        frame_num, _frame_frac = self.frame_of(t_event)
+        return float(self.distance[frame_num, team_idx])
+
+class BakedLeaderboard:
+    """
+    Standings looked up from baked frames, in place of a Leaderboard
+    """
+    def __init__(self, baked_positions: BakedPositions, focus_team: str, top_count: int = 3):
+        self.baked_positions = baked_positions
+        self.team_numbers = baked_positions.team_numbers
+        self.team_index = baked_positions.team_index
+        self.top_count = top_count
+        self.frame_num = 0
+        self.set_focus_team(focus_team)
+
+    def copy(self) -> "BakedLeaderboard":
+        """
+        Return a leaderboard at the same frame that can be moved independently
+        """
+        return copy.copy(self)
+
+    def set_focus_team(self, focus_team: str) -> None:
+        """
+        Change the team whose standing is cached in focus_position and focus_points
+        """
+        self.focus_team = focus_team
+        self.focus_idx = self.team_index.get(focus_team, -1)
+        self._refresh()
+
+    def reset(self) -> None:
+        """
+        Move the leaderboard back to the start of the event
+        """
+        self.frame_num = 0
+        self._refresh()
+
+    def seek(self, t_event: float) -> None:
+        """
+        Move the standings to the frame at or before t_event
+        """
+        frame_num, _frame_frac = self.baked_positions.frame_of(t_event)
+        if frame_num != self.frame_num:
+            self.frame_num = frame_num
+            self._refresh()
+
+    def position_of(self, team_number: str) -> int:
+        """
+        Return the 1-based position of a team in the current standings
+        """
+        return int(self.baked_positions.rank[self.frame_num, self.team_index[team_number]])
+
+    def points_of(self, team_number: str) -> int:
+        """
+        Return the current points of a team
+        """
+        return int(self.baked_positions.points[self.frame_num, self.team_index[team_number]])
+
+    def standings(self) -> "list[tuple[str, int]]":
+        """
+        Return every team ordered by points, as (team_number, points), leader first
+        """
+        order = np.argsort(self.baked_positions.rank[self.frame_num])
+        points = self.baked_positions.points[self.frame_num]
+        return [(self.team_numbers[team_idx], int(points[team_idx])) for team_idx in order.tolist()]
+
+    def _refresh(self) -> None:
+        """
+        Cache the top teams and focus team standing so reads while drawing are O(1)
+        """
+        rank = self.baked_positions.rank[self.frame_num]
+        points = self.baked_positions.points[self.frame_num]
+        n_top = min(self.top_count, len(self.team_numbers))
+        top_idx = np.flatnonzero(rank <= n_top)
+        top_idx = top_idx[np.argsort(rank[top_idx])]
+        self.top_teams = [(self.team_numbers[team_idx], int(points[team_idx])) for team_idx in top_idx.tolist()]
+
+        if self.focus_idx >= 0:
+            self.focus_position = int(rank[self.focus_idx])
+            self.focus_points = int(points[self.focus_idx])
+        else:
+            self.focus_position = 0
+            self.focus_points = 0
+
+def replay_settings(config: dict) -> dict:
+    """
+    Return the settings that decide which event times are baked
+    """
+    return {
+        "event_length": float(config["event_length"]),
+        "replay_duration": float(config.get("replay_duration", 30)),
+        "fps": float(config.get("replay_fps", 20)),
+    }
+
+def event_frames_per_sec(settings: dict) -> float:
+    """
+    Return the number of replay frames per second of event time
+    """
+    # the replay covers the event plus half an hour for late arrivals, as in ResultsPlotter.event_time_scale
+    event_secs = (settings["event_length"] + 0.5) * 3600
+    return settings["replay_duration"] * settings["fps"] / event_secs
+
+def bake_event(config: dict) -> Path:
+    """
+    Load the csv results of an event described by config and bake its trajectory file
+    """
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    trajectory_file = TrajectoryFile.for_config(config)
+    trajectory_file.bake(config, results_rdr.parse_csv_results_directory(), control_coords)
+    return trajectory_file.path
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "r") as config_fp:
+        bake_event(yaml.safe_load(config_fp))
@@ -0,0 +1,179 @@
+from multiprocessing import Pool
+import json
+import os
+from pathlib import Path
+import sys
+import time
+
+import pandas as pd
+import yaml
+
+from results_plotter import results_plotter
+from results_plotter import video_exporter
+from results_reader import event_bundle
+from results_reader import results_reader
+from utils import PixelCoordinate
+import utils
+
+# replay plotter owned by each worker process, created once per event by _init_batch_worker
+_batch_plotter = None
+_batch_config = None
+
+class BatchRenderer:
+    """
+    Export a personalised replay for every team of one or more events, each with a different team
+    as the focus
+
+    Each event is loaded once and every worker process builds a single plotter for it, so the
+    parsed results, team positions and leaderboard are shared by all of that worker's renders.
+    Whole videos are handed out to the workers. Finished videos are recorded in a progress file
+    next to them, so an interrupted batch picks up where it stopped. Settings are read from each
+    event's config, all optional:
+    - batch_directory: directory the replays are written to, one per team
+    - batch_teams: list of team numbers to render, every team if not given
+    - batch_workers: number of render processes, 1 renders in this process
+    - export_*: format and size of each replay, as for VideoExporter
+    """
+    def __init__(self, configs: "list[dict]", workers: "int | None" = None):
+        self.configs = configs
+        self.workers = workers
+        self.videos_rendered = 0
+        self.videos_skipped = 0
+        self.render_secs = 0.0
+
+    def run(self) -> None:
+        """
+        Render every outstanding replay of every event
+        """
+        start = time.perf_counter()
+        for config in self.configs:
+            self._run_event(config)
+        self.render_secs = time.perf_counter() - start
+
+    def videos_per_hour(self) -> float:
+        """
+        Return the number of replays rendered per hour by the last run
+        """
+        return self.videos_rendered / max(self.render_secs, 1e-9) * 3600
+
+    def summary(self) -> str:
+        """
+        Return a one line description of the throughput of the last run
+        """
+        return (f"{self.videos_rendered} replays rendered, {self.videos_skipped} already done, "
+                f"in {self.render_secs:.1f} secs ({self.videos_per_hour():.1f} videos/hour)")
+
+    def _run_event(self, config: dict) -> None:
+        """
+        Render the outstanding replays of a single event
+        """
+        output_dir = batch_directory(config)
+        progress_path = output_dir / "batch-progress.json"
+        progress = load_progress(progress_path)
+
+        control_coords, results, leg_stats = load_event(config)
+        teams = [str(team) for team in config.get("batch_teams", results.keys())]
+        pending = [team for team in teams
+                   if team not in progress or not Path(progress[team]["path"]).exists()]
+        self.videos_skipped += len(teams) - len(pending)
+        if not pending:
+            return
+
+        workers = self.workers or int(config.get("batch_workers", os.cpu_count() or 1))
+        workers = min(workers, len(pending))
+        init_args = (config, results, control_coords, leg_stats)
+        if workers > 1:
+            with Pool(workers, initializer=_init_batch_worker, initargs=init_args) as pool:
+                # videos finish in any order, each is recorded as soon as it is written
+                for team, path, secs in pool.imap_unordered(_render_team_replay, pending):
+                    self._record(progress, progress_path, team, path, secs)
+        else:
+            _init_batch_worker(*init_args)
+            for team in pending:
+                self._record(progress, progress_path, *_render_team_replay(team))
+
+    def _record(self, progress: dict, progress_path: Path, team: str, path: str, secs: float) -> None:
+        """
+        Record a finished replay in the progress file
+        """
+        progress[team] = {"path": path, "secs": round(secs, 3)}
+        save_progress(progress_path, progress)
+        self.videos_rendered += 1
+        print(f"Team {team}: {path} ({secs:.1f} secs)")
+
+def batch_directory(config: dict) -> Path:
+    """
+    Return the directory the replays of an event are written to, by default results_directory/replays
+    """
+    default_dir = Path(config["results_directory"]) / "replays"
+    return Path(config.get("batch_directory", default_dir))
+
+def load_event(config: dict) -> "tuple[dict[str, PixelCoordinate], dict[str, pd.Dataframe], pd.DataFrame]":
+    """
+    Load the control coordinates, results and leg statistics of an event, from its bundle if it is
+    up to date with the results or the csv files otherwise
+    """
+    bundle = event_bundle.EventBundle.for_config(config)
+    if bundle.is_current(config):
+        _config, control_coords, results, leg_stats, _control_stats = bundle.load()
+        return control_coords, results, leg_stats
+
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    return control_coords, results_rdr.parse_csv_results_directory(), results_rdr.parse_leg_statistics_csv()
+
+def load_progress(progress_path: Path) -> "dict[str, dict]":
+    """
+    Return the replays already finished, by team number
+    """
+    if not progress_path.exists():
+        return {}
+    with open(progress_path, "r") as progress_fp:
+        return json.load(progress_fp)
+
+def save_progress(progress_path: Path, progress: "dict[str, dict]") -> None:
+    """
+    Write the finished replays, replacing the file in one step so an interruption can't leave it half written
+    """
+    progress_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = progress_path.with_suffix(".tmp")
+    with open(temp_path, "w") as progress_fp:
+        json.dump(progress, progress_fp, indent=2)
+    os.replace(temp_path, progress_path)
+
+def _init_batch_worker(config: dict,
+                       results: "dict[str, pd.Dataframe]",
+                       control_coordinates: "dict[str, PixelCoordinate]",
+                       leg_statistics: pd.DataFrame) -> None:
+    """
+    Create the replay plotter used by this process for every replay of the event
+    """
+    global _batch_plotter, _batch_config
+    # the focus team is changed for each replay, so keep it out of the caller's config
+    _batch_config = dict(config)
+    _batch_plotter = results_plotter.ResultsPlotter(_batch_config, results, control_coordinates, leg_statistics)
+
+def _render_team_replay(team: str) -> "tuple[str, str, float]":
+    """
+    Export the replay with team as the focus
+    Returns the team, the path written to and the secs taken
+    """
+    start = time.perf_counter()
+    _batch_plotter.set_focus_team(team)
+
+    extension = "" if _batch_config.get("export_format", "mp4") == "png" else ".mp4"
+    export_config = {**_batch_config, "export_path": str(batch_directory(_batch_config) / f"{team}{extension}")}
+    exporter = video_exporter.VideoExporter(export_config, _batch_plotter.results,
+                                            _batch_plotter.control_coordinates, _batch_plotter.leg_statistics)
+    path = exporter.export(plotter=_batch_plotter)
+    return team, str(path), time.perf_counter() - start
+
+if __name__ == "__main__":
+    batch_configs = []
+    for config_path in sys.argv[1:]:
+        with open(config_path, "r") as config_fp:
+            batch_configs.append(yaml.safe_load(config_fp))
+
+    renderer = BatchRenderer(batch_configs)
+    renderer.run()
+    print(renderer.summary())
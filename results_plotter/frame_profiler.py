@@ -0,0 +1,142 @@
+from contextlib import nullcontext
+import json
+from pathlib import Path
+import time
+
+import numpy as np
+
+# shared no-op context returned for every stage while profiling is disabled
+_DISABLED_STAGE = nullcontext()
+
+class FrameProfiler:
+    """
+    Record how long each stage of each replay frame takes
+
+    Stages are timed with `with profiler.stage(name):`. While disabled every call returns the same
+    no-op context, so instrumentation left in the frame loop costs almost nothing
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        # (stage, start secs since start_time, duration secs, frame number)
+        self.events = []
+        self.frame_num = -1
+        self.frame_start = 0.0
+        self.frame_times = []
+
+    def begin_frame(self) -> None:
+        """
+        Mark the start of a new frame
+        """
+        if not self.enabled:
+            return
+        self.frame_num += 1
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self) -> None:
+        """
+        Mark the end of the current frame
+        """
+        if not self.enabled:
+            return
+        end = time.perf_counter()
+        self.frame_times.append(end - self.frame_start)
+        self.events.append(("frame", self.frame_start - self.start_time, end - self.frame_start, self.frame_num))
+
+    def stage(self, name: str):
+        """
+        Return a context manager timing the named stage of the current frame
+        """
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return _Stage(self, name)
+
+    def summary(self) -> "dict[str, dict[str, float]]":
+        """
+        Return the mean and 50th, 90th and 99th percentile duration in milliseconds of each stage
+        """
+        durations = {}
+        for name, _start, duration, _frame_num in self.events:
+            durations.setdefault(name, []).append(duration * 1000)
+
+        summary = {}
+        for name, stage_durations in durations.items():
+            p50, p90, p99 = np.percentile(stage_durations, [50, 90, 99])
+            summary[name] = {
+                "count": len(stage_durations),
+                "mean_ms": float(np.mean(stage_durations)),
+                "p50_ms": float(p50),
+                "p90_ms": float(p90),
+                "p99_ms": float(p99),
+            }
+        return summary
+
+    def summary_text(self) -> str:
+        """
+        Return the summary as a table, one stage per line
+        """
+        lines = [f"{'stage':<20} {'count':>6} {'mean ms':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<20} {stats['count']:>6} {stats['mean_ms']:>8.2f} {stats['p50_ms']:>8.2f} "
+                         f"{stats['p90_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+        return "\n".join(lines)
+
+    def hud_lines(self, window: int = 20) -> "list[str]":
+        """
+        Return lines of text for an on screen overlay: the fps and the mean duration of each stage
+        over the last window frames
+        """
+        if not self.frame_times:
+            return []
+
+        recent_frames = self.frame_times[-window:]
+        fps = len(recent_frames) / max(sum(recent_frames), 1e-9)
+        first_frame = self.frame_num - window + 1
+        stage_totals = {}
+        for name, _start, duration, frame_num in reversed(self.events):
+            if frame_num < first_frame:
+                break
+            if name != "frame":
+                stage_totals[name] = stage_totals.get(name, 0.0) + duration
+
+        lines = [f"{fps:.1f} fps"]
+        # stages were collected latest first
+        for name, total in reversed(list(stage_totals.items())):
+            lines.append(f"{name}: {total / len(recent_frames) * 1000:.1f} ms")
+        return lines
+
+    def write_trace(self, path: Path) -> None:
+        """
+        Write every recorded stage in Chrome trace event format, viewable in chrome://tracing or Perfetto
+        """
+        trace_events = []
+        for name, start, duration, frame_num in self.events:
+            trace_events.append({
+                "name": name,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": 0,
+                "tid": 0,
+                "args": {"frame": frame_num},
+            })
+        with open(path, "w") as trace_fp:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_fp)
+
+class _Stage:
+    """
+    Context manager recording the duration of a single stage
+    """
+    def __init__(self, profiler: FrameProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "_Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        profiler = self.profiler
+        profiler.events.append((self.name, self.start - profiler.start_time,
+                                time.perf_counter() - self.start, profiler.frame_num))
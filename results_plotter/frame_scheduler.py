@@ -0,0 +1,152 @@
+import time
+
+class FrameScheduler:
+    """
+    Tie replay time to the monotonic wall clock, dropping frames when rendering falls behind
+    and lowering render quality to hold the target frame rate
+
+    Quality levels run from 0 (cheapest) to max_quality (full detail), and are only changed after
+    a full second of frames at the current level so the picture doesn't flicker between levels
+
+    Frames are due at a fixed rate of wall time, while the replay time shown by each frame follows
+    a clock that can be paused, sped up, slowed down, reversed or moved to any time
+    """
+    def __init__(self, sim_length: float, fps: float, max_quality: int = 2):
+        self.sim_length = sim_length
+        self.fps = fps
+        self.frame_budget = 1 / fps
+        self.max_quality = max_quality
+        self.quality = max_quality
+
+        self.start_time = 0.0
+        self.frame_num = -1
+        self.frame_start = 0.0
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self.avg_render_time = 0.0
+        self.frames_at_quality = 0
+
+        # replay time is clock_sim_time at wall time clock_wall_time, moving at rate while playing
+        self.rate = 1.0
+        self.paused = False
+        self.clock_wall_time = 0.0
+        self.clock_sim_time = 0.0
+
+    def start(self) -> None:
+        """
+        Start the replay clock
+        """
+        self.start_time = time.monotonic()
+        self.clock_wall_time = self.start_time
+        self.clock_sim_time = 0.0
+
+    def next_frame(self) -> "float | None":
+        """
+        Return the replay time in seconds of the next frame to render, skipping any frames whose
+        deadline has already passed, or None once the replay has played forwards to the end
+        """
+        self.frame_start = time.monotonic()
+        due_frame = int((self.frame_start - self.start_time) * self.fps)
+        if due_frame <= self.frame_num:
+            due_frame = self.frame_num + 1
+
+        self.frames_dropped += due_frame - self.frame_num - 1
+        self.frame_num = due_frame
+
+        sim_time = self.sim_time_at(self.start_time + self.frame_num / self.fps)
+        if sim_time >= self.sim_length:
+            return None
+        if sim_time <= 0 and self.rate < 0 and not self.paused:
+            # rewound to the start, hold the first frame
+            self.seek(0)
+            self.paused = True
+        return max(sim_time, 0.0)
+
+    def sim_time_at(self, wall_time: float) -> float:
+        """
+        Return the replay time shown at a wall clock time
+        """
+        if self.paused:
+            return self.clock_sim_time
+        return self.clock_sim_time + (wall_time - self.clock_wall_time) * self.rate
+
+    def current_sim_time(self) -> float:
+        """
+        Return the replay time shown by the current frame
+        """
+        return min(max(self.sim_time_at(self.start_time + self.frame_num / self.fps), 0.0), self.sim_length)
+
+    def seek(self, sim_time: float) -> None:
+        """
+        Move the replay to sim_time seconds, kept within the replay
+        """
+        self.clock_sim_time = min(max(sim_time, 0.0), self.sim_length - 1 / self.fps)
+        self.clock_wall_time = self.start_time + (self.frame_num + 1) / self.fps
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Change how many seconds of replay pass per second of wall time, negative plays in reverse
+        """
+        self.seek(self.current_sim_time())
+        self.rate = rate
+
+    def toggle_pause(self) -> None:
+        """
+        Pause or resume the replay at the current frame
+        """
+        self.seek(self.current_sim_time())
+        self.paused = not self.paused
+
+    def frame_done(self, render_time: "float | None" = None) -> None:
+        """
+        Record how long the current frame took and adapt the quality level to the frame budget
+
+        args:
+        - render_time: seconds the frame cost to render, if not the time since next_frame returned
+        """
+        if render_time is None:
+            render_time = time.monotonic() - self.frame_start
+        self.frames_rendered += 1
+        self.frames_at_quality += 1
+
+        # exponential moving average over roughly the last 10 frames
+        if self.frames_at_quality == 1:
+            self.avg_render_time = render_time
+        else:
+            self.avg_render_time += 0.1 * (render_time - self.avg_render_time)
+
+        if self.frames_at_quality < self.fps:
+            return
+
+        if self.avg_render_time > 0.9 * self.frame_budget and self.quality > 0:
+            self.quality -= 1
+            self.frames_at_quality = 0
+        elif self.avg_render_time < 0.5 * self.frame_budget and self.quality < self.max_quality:
+            self.quality += 1
+            self.frames_at_quality = 0
+
+    def wait(self) -> None:
+        """
+        Sleep until the deadline of the next frame, if it hasn't already passed
+        """
+        next_deadline = self.start_time + (self.frame_num + 1) / self.fps
+        remaining = next_deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def achieved_fps(self) -> float:
+        """
+        Return the number of frames actually rendered per second of wall time
+        """
+        elapsed = time.monotonic() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return self.frames_rendered / elapsed
+
+    def summary(self) -> str:
+        """
+        Return a one line summary of the frame rate achieved
+        """
+        return (f"Rendered {self.frames_rendered} frames at {self.achieved_fps():.1f} fps "
+                f"(target {self.fps:.1f} fps), dropped {self.frames_dropped} frames, "
+                f"final quality level {self.quality}/{self.max_quality}")
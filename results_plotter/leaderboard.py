@@ -0,0 +1,230 @@
+import copy
+
+import numpy as np
+
+from results_plotter.position_engine import PositionEngine
+
+class Leaderboard:
+    """
+    Keep the standings of every team up to date as the replay time moves forwards or backwards
+
+    All changes in points are precomputed as a single time ordered stream of events. Teams are
+    ranked by (points, team index) descending, matching the previous full sort, and each possible
+    (points, team) pair is given a slot in a Fenwick tree so that applying or reverting an event
+    and looking up a team's rank are all O(log n)
+
+    Every keyframe_interval events the slot of every team is kept as a keyframe, so seeking a long
+    way restores the nearest keyframe and applies at most half an interval of events, instead of
+    replaying every event in between
+    """
+    def __init__(self, engine: PositionEngine, focus_team: str, top_count: int = 3, keyframe_interval: int = 1024):
+        self.team_numbers = engine.team_numbers
+        self.focus_team = focus_team
+        self.top_count = top_count
+        n_teams = len(self.team_numbers)
+
+        # a points change event for every row whose points differ from the row before it
+        real_rows = np.ones(len(engine.cumulative_points), dtype=bool)
+        real_rows[engine.padded_offsets] = False
+        row_idx = np.flatnonzero(real_rows)
+        old_points = engine.cumulative_points[row_idx - 1]
+        new_points = engine.cumulative_points[row_idx]
+        changed = old_points != new_points
+        row_idx, new_points = row_idx[changed], new_points[changed]
+        event_team = np.searchsorted(engine.padded_offsets, row_idx, side="right") - 1
+
+        order = np.argsort(engine.cumulative_time_ms[row_idx], kind="stable")
+        self.event_times_ms = engine.cumulative_time_ms[row_idx][order]
+        self.event_team = event_team[order]
+        self.event_new_points = new_points[order]
+
+        # compress every (points, team) pair that can occur into an ascending slot index
+        all_points = np.concatenate([np.zeros(n_teams, dtype=np.int64), self.event_new_points])
+        all_teams = np.concatenate([np.arange(n_teams, dtype=np.int64), self.event_team])
+        unique_pairs, slot_of_key = np.unique(np.stack([all_points, all_teams], axis=1), axis=0, return_inverse=True)
+        slot_of_key = slot_of_key.reshape(-1)
+        self.slot_points = unique_pairs[:, 0].tolist()
+        self.slot_team = unique_pairs[:, 1].tolist()
+        self.initial_slots = slot_of_key[:n_teams]
+        self.event_new_slot = slot_of_key[n_teams:].tolist()
+
+        # the slot each team occupies before each event, needed to apply events in either direction
+        self.keyframe_interval = keyframe_interval
+        n_keyframes = len(self.event_new_slot) // keyframe_interval + 1
+        self.keyframes = np.empty((n_keyframes, n_teams), dtype=np.int32)
+        team_slot = self.initial_slots.copy()
+        old_slots = np.empty(len(self.event_new_slot), dtype=np.int64)
+        for event_idx, (team, new_slot) in enumerate(zip(self.event_team.tolist(), self.event_new_slot)):
+            if event_idx % keyframe_interval == 0:
+                self.keyframes[event_idx // keyframe_interval] = team_slot
+            old_slots[event_idx] = team_slot[team]
+            team_slot[team] = new_slot
+        if len(self.event_new_slot) % keyframe_interval == 0:
+            self.keyframes[-1] = team_slot
+        self.event_old_slot = old_slots.tolist()
+        self.event_team_list = self.event_team.tolist()
+
+        self.n_slots = len(self.slot_points)
+        self.n_teams = n_teams
+        self.team_index = engine.team_index
+        self.focus_idx = self.team_index.get(focus_team, -1)
+        self.reset()
+
+    def copy(self) -> "Leaderboard":
+        """
+        Return a leaderboard at the same standings that can be moved independently, sharing the
+        precomputed events and keyframes
+        """
+        clone = copy.copy(self)
+        clone.team_slot = list(self.team_slot)
+        clone.tree = list(self.tree)
+        return clone
+
+    def set_focus_team(self, focus_team: str) -> None:
+        """
+        Change the team whose standing is cached in focus_position and focus_points
+        """
+        self.focus_team = focus_team
+        self.focus_idx = self.team_index.get(focus_team, -1)
+        self._refresh()
+
+    def reset(self) -> None:
+        """
+        Move the leaderboard back to the start of the event, every team on 0 points
+        """
+        self.team_slot = self.initial_slots.tolist()
+        occupied = np.zeros(self.n_slots, dtype=np.int64)
+        occupied[self.initial_slots] = 1
+        self._build_tree(occupied)
+        self.cursor = 0
+        self._refresh()
+
+    def seek(self, t_event: float) -> None:
+        """
+        Apply or revert points change events so the standings reflect the controls reached
+        before t_event
+
+        args:
+        - t_event: float representing seconds elapsed since start of the event
+        """
+        target = int(np.searchsorted(self.event_times_ms, int(t_event * 1000), side="left"))
+        if target == self.cursor:
+            return
+
+        if abs(target - self.cursor) > self.keyframe_interval // 2:
+            nearest_keyframe = (target + self.keyframe_interval // 2) // self.keyframe_interval
+            self._restore_keyframe(min(nearest_keyframe, len(self.keyframes) - 1))
+
+        while self.cursor < target:
+            event_idx = self.cursor
+            self._move(self.event_team_list[event_idx], self.event_new_slot[event_idx])
+            self.cursor += 1
+
+        while self.cursor > target:
+            self.cursor -= 1
+            event_idx = self.cursor
+            self._move(self.event_team_list[event_idx], self.event_old_slot[event_idx])
+
+        self._refresh()
+
+    def position_of(self, team_number: str) -> int:
+        """
+        Return the 1-based position of a team in the current standings
+        """
+        team_idx = self.team_index[team_number]
+        return self.n_teams - self._prefix_sum(self.team_slot[team_idx] + 1) + 1
+
+    def points_of(self, team_number: str) -> int:
+        """
+        Return the current points of a team
+        """
+        team_idx = self.team_index[team_number]
+        return self.slot_points[self.team_slot[team_idx]]
+
+    def standings(self) -> "list[tuple[str, int]]":
+        """
+        Return every team ordered by points, as (team_number, points), leader first
+        """
+        occupied = sorted(self.team_slot, reverse=True)
+        return [(self.team_numbers[self.slot_team[slot]], self.slot_points[slot]) for slot in occupied]
+
+    def _refresh(self) -> None:
+        """
+        Cache the top teams and focus team standing so reads while drawing are O(1)
+        """
+        self.top_teams = []
+        for position in range(1, min(self.top_count, self.n_teams) + 1):
+            slot = self._find_nth_smallest(self.n_teams - position + 1)
+            self.top_teams.append((self.team_numbers[self.slot_team[slot]], self.slot_points[slot]))
+
+        if self.focus_idx >= 0:
+            focus_slot = self.team_slot[self.focus_idx]
+            self.focus_position = self.n_teams - self._prefix_sum(focus_slot + 1) + 1
+            self.focus_points = self.slot_points[focus_slot]
+        else:
+            self.focus_position = 0
+            self.focus_points = 0
+
+    def _restore_keyframe(self, keyframe_idx: int) -> None:
+        """
+        Jump to the standings before event keyframe_idx * keyframe_interval
+        """
+        keyframe = self.keyframes[keyframe_idx]
+        self.team_slot = keyframe.tolist()
+        self._build_tree(np.bincount(keyframe, minlength=self.n_slots))
+        self.cursor = keyframe_idx * self.keyframe_interval
+
+    def _move(self, team_idx: int, new_slot: int) -> None:
+        """
+        Move a team from its current slot into new_slot
+        """
+        self._add(self.team_slot[team_idx], -1)
+        self._add(new_slot, 1)
+        self.team_slot[team_idx] = new_slot
+
+    def _build_tree(self, occupied: np.ndarray) -> None:
+        """
+        Build the Fenwick tree over slot occupancy in O(n)
+        """
+        prefix = np.zeros(self.n_slots + 1, dtype=np.int64)
+        np.cumsum(occupied, out=prefix[1:])
+        tree_idx = np.arange(1, self.n_slots + 1)
+        lowbit = tree_idx & -tree_idx
+        tree = np.zeros(self.n_slots + 1, dtype=np.int64)
+        tree[1:] = prefix[tree_idx] - prefix[tree_idx - lowbit]
+        self.tree = tree.tolist()
+        self.top_bit = 1 << (self.n_slots.bit_length() - 1) if self.n_slots else 0
+
+    def _add(self, slot: int, delta: int) -> None:
+        """
+        Add delta to the occupancy of a slot
+        """
+        tree_idx = slot + 1
+        while tree_idx <= self.n_slots:
+            self.tree[tree_idx] += delta
+            tree_idx += tree_idx & -tree_idx
+
+    def _prefix_sum(self, count: int) -> int:
+        """
+        Return the number of occupied slots in [0, count)
+        """
+        total = 0
+        tree_idx = count
+        while tree_idx > 0:
+            total += self.tree[tree_idx]
+            tree_idx -= tree_idx & -tree_idx
+        return total
+
+    def _find_nth_smallest(self, n: int) -> int:
+        """
+        Return the slot holding the nth (1-based) smallest occupied key
+        """
+        tree_idx = 0
+        bit = self.top_bit
+        while bit:
+            next_idx = tree_idx + bit
+            if next_idx <= self.n_slots and self.tree[next_idx] < n:
+                tree_idx = next_idx
+                n -= self.tree[next_idx]
+            bit >>= 1
+        return tree_idx
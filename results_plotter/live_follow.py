@@ -0,0 +1,136 @@
+import os
+from pathlib import Path
+import threading
+import time
+import traceback
+
+import pandas as pd
+
+from results_analytics import results_analytics
+from results_plotter import leaderboard
+from results_plotter import position_engine
+from results_reader import event_store
+from results_reader import results_reader
+from utils import PixelCoordinate
+
+class LiveUpdate:
+    """
+    The results of an event after new or changed txt files were parsed, with the position engine,
+    leaderboard and analytics already rebuilt from them, ready to be swapped into a running replay
+    """
+    def __init__(self, results: "dict[str, pd.Dataframe]",
+                 engine: position_engine.PositionEngine,
+                 standings: leaderboard.Leaderboard,
+                 analytics: results_analytics.ResultsAnalytics,
+                 changed_teams: "list[str]",
+                 removed_teams: "list[str]"):
+        self.results = results
+        self.position_engine = engine
+        self.leaderboard = standings
+        self.analytics = analytics
+        self.changed_teams = changed_teams
+        self.removed_teams = removed_teams
+
+class ResultsWatcher:
+    """
+    Watch the results directory of a running event from a background thread, polling it for
+    txt files that are new or have changed
+
+    Each poll only lists the directory and compares the size and modification time of every txt
+    file with the previous poll, the results are brought up to date only when something differs.
+    Everything that touches the disk or rebuilds the replay state happens on the watcher thread.
+    The render loop only takes the most recent finished update, a swap under a lock, so it never
+    waits on a file being read or parsed
+    """
+    def __init__(self, config: dict,
+                 control_coordinates: "dict[str, PixelCoordinate]",
+                 poll_interval: "float | None" = None):
+        self.config = config
+        self.control_coordinates = control_coordinates
+        if poll_interval is None:
+            poll_interval = float(config.get("live_poll_interval", 5))
+        self.poll_interval = poll_interval
+        self.results_rdr = results_reader.ResultsReader(config, control_coordinates)
+
+        self.lock = threading.Lock()
+        self.pending_update = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_check_time = None
+        # size and modification time of every txt file when the results were last brought up to date
+        self.directory_snapshot = None
+
+    def start(self) -> None:
+        """
+        Start polling the results directory
+        """
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="results-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop polling, waiting for a check in progress to finish
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def take_update(self) -> "LiveUpdate | None":
+        """
+        Return the latest update not yet taken, None if the results haven't changed since the last one
+        """
+        with self.lock:
+            update, self.pending_update = self.pending_update, None
+        return update
+
+    def check(self) -> bool:
+        """
+        Parse any txt files that are new or changed, and if there are any rebuild the position
+        engine, leaderboard and analytics from every team's results
+        Returns whether there was an update
+        """
+        snapshot = directory_snapshot(Path(self.config["results_directory"]))
+        self.last_check_time = time.time()
+        if snapshot == self.directory_snapshot:
+            return False
+
+        results, changed_teams, removed_teams = self.results_rdr.update_txt_results_directory()
+        self.directory_snapshot = snapshot
+        if not changed_teams and not removed_teams:
+            return False
+
+        store = event_store.EventStore.from_results(results, self.control_coordinates)
+        engine = position_engine.PositionEngine.from_store(store)
+        standings = leaderboard.Leaderboard(engine, self.config["team_number"])
+        analytics = results_analytics.ResultsAnalytics.legs_from_store(store)
+        with self.lock:
+            pending_update = self.pending_update
+            if pending_update is not None:
+                # the render loop hasn't taken the previous update yet, keep every team it changed
+                changed_teams = list(dict.fromkeys(pending_update.changed_teams + changed_teams))
+                removed_teams = list(dict.fromkeys(pending_update.removed_teams + removed_teams))
+            self.pending_update = LiveUpdate(results, engine, standings, analytics, changed_teams, removed_teams)
+        return True
+
+    def _run(self) -> None:
+        """
+        Check the results directory every poll_interval seconds until stopped
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.check()
+            except Exception:
+                # a file caught part way through being written fails to parse, it is picked up
+                # again once it has finished changing
+                traceback.print_exc()
+            self.stop_event.wait(self.poll_interval)
+
+def directory_snapshot(results_dir: Path) -> "dict[str, tuple[int, int]]":
+    """
+    Return the size and modification time of every txt file in a directory, as name:(size, mtime_ns)
+    """
+    with os.scandir(results_dir) as entries:
+        return {entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+                for entry in entries if entry.name.endswith(".txt")}
@@ -0,0 +1,122 @@
+import math
+
+import cv2
+import numpy as np
+
+class MapPyramid:
+    """
+    Downsampled copies of a map image, each half the size of the one before, built once so any
+    zoom level can be rendered from a level close to the output resolution
+    """
+    def __init__(self, image: np.ndarray, min_size: int = 256):
+        self.levels = [image]
+        while min(self.levels[-1].shape[:2]) // 2 >= min_size:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+
+    def level_for_scale(self, scale: float) -> int:
+        """
+        Return the smallest level that still has at least as much detail as the output
+
+        args:
+        - scale: float representing output pixels per full resolution map pixel
+        """
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log2(1 / scale)))
+        return min(level, len(self.levels) - 1)
+
+    def render(self, viewport: "Viewport") -> np.ndarray:
+        """
+        Render the area of the map visible in the viewport at the viewport's output size
+        """
+        level = self.level_for_scale(viewport.scale)
+        level_factor = 2**level
+        level_scale = viewport.scale * level_factor
+        x0, y0 = viewport.origin()
+        # affine map from level pixels to output pixels, only the output pixels are computed
+        transform = np.array([[level_scale, 0, -x0 / level_factor * level_scale],
+                              [0, level_scale, -y0 / level_factor * level_scale]], dtype=np.float64)
+        return cv2.warpAffine(self.levels[level], transform, (viewport.width, viewport.height),
+                              flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+
+class Viewport:
+    """
+    The area of the map currently shown and the size it is shown at
+
+    Map coordinates are full resolution map pixels, view coordinates are pixels of the rendered
+    output. At zoom 1 the whole map fits in the output, and the centre is kept on the map
+    """
+    def __init__(self, map_width: int, map_height: int, width: int, height: int):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.zoom = 1.0
+        self.max_zoom = 32.0
+        self.center_x = map_width / 2
+        self.center_y = map_height / 2
+        # incremented on every change so cached renders of the view can be invalidated
+        self.version = 0
+        self.set_output_size(width, height)
+
+    def set_output_size(self, width: int, height: int) -> None:
+        """
+        Set the size in pixels of the rendered output
+        """
+        self.width = int(width)
+        self.height = int(height)
+        self.fit_scale = min(self.width / self.map_width, self.height / self.map_height)
+        self.version += 1
+
+    @property
+    def scale(self) -> float:
+        """
+        Output pixels per full resolution map pixel
+        """
+        return self.fit_scale * self.zoom
+
+    def origin(self) -> "tuple[float, float]":
+        """
+        Return the map coordinates shown at the top left of the output
+        """
+        return (self.center_x - self.width / (2 * self.scale),
+                self.center_y - self.height / (2 * self.scale))
+
+    def to_view(self, map_xy: np.ndarray) -> np.ndarray:
+        """
+        Convert an (n, 2) array of map coordinates to integer view coordinates
+        """
+        x0, y0 = self.origin()
+        view_xy = np.empty(map_xy.shape, dtype=np.int64)
+        view_xy[:, 0] = (map_xy[:, 0] - x0) * self.scale
+        view_xy[:, 1] = (map_xy[:, 1] - y0) * self.scale
+        return view_xy
+
+    def zoom_by(self, factor: float) -> None:
+        """
+        Zoom in (factor > 1) or out (factor < 1) about the centre of the view
+        """
+        self.zoom = min(max(self.zoom * factor, 1.0), self.max_zoom)
+        self._clamp_center()
+        self.version += 1
+
+    def pan(self, dx_fraction: float, dy_fraction: float) -> None:
+        """
+        Move the view by a fraction of its width and height
+        """
+        self.center_x += dx_fraction * self.width / self.scale
+        self.center_y += dy_fraction * self.height / self.scale
+        self._clamp_center()
+        self.version += 1
+
+    def _clamp_center(self) -> None:
+        """
+        Keep the centre of the view on the map
+        """
+        self.center_x = min(max(self.center_x, 0), self.map_width)
+        self.center_y = min(max(self.center_y, 0), self.map_height)
+
+def fit_size(map_width: int, map_height: int, max_width: int, max_height: int) -> "tuple[int, int]":
+    """
+    Return the size of the map scaled down to fit within max_width x max_height, keeping its aspect ratio
+    """
+    ratio = min(max_width / map_width, max_height / map_height, 1.0)
+    return max(1, int(map_width * ratio)), max(1, int(map_height * ratio))
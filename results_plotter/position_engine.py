@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from results_reader import event_store
+from utils import PixelCoordinate
+
+class PositionEngine:
+    """
+    Pack every team's result into flat arrays once so the replay state of all teams can be
+    looked up for any event time in a single batched call
+
+    Each team's rows are stored contiguously, preceded by a virtual row for the start at HH, so
+    row lookups for all teams reduce to one np.searchsorted over a globally sorted key of
+    team_index * key_stride + cumulative_time_ms
+    """
+    def __init__(self, results: "dict[str, pd.Dataframe]", control_coordinates: "dict[str, PixelCoordinate]"):
+        self._load(event_store.EventStore.from_results(results, control_coordinates))
+
+    @classmethod
+    def from_store(cls, store: event_store.EventStore) -> "PositionEngine":
+        """
+        Return the engine of an event already packed into an EventStore
+        """
+        engine = cls.__new__(cls)
+        engine._load(store)
+        return engine
+
+    def _load(self, store: event_store.EventStore) -> None:
+        """
+        Pad the store's columns with a start row for each team
+        """
+        self.team_numbers = store.team_numbers
+        self.team_index = store.team_index
+        n_teams = len(self.team_numbers)
+
+        # offsets of each team's rows within the real (unpadded) rows
+        self.offsets = store.team_offsets
+        team_lengths = np.diff(self.offsets)
+        # offsets of each team's virtual start row within the padded rows
+        self.padded_offsets = self.offsets[:-1] + np.arange(n_teams, dtype=np.int64)
+        self.last_rows = self.padded_offsets + team_lengths
+
+        n_padded = int(self.offsets[-1]) + n_teams
+        self.cumulative_time_ms = np.zeros(n_padded, dtype=np.int64)
+        self.time_split_ms = np.zeros(n_padded, dtype=np.int64)
+        self.cumulative_points = np.zeros(n_padded, dtype=np.int64)
+        self.cumulative_distance = np.zeros(n_padded, dtype=np.float64)
+        self.x = np.zeros(n_padded, dtype=np.float64)
+        self.y = np.zeros(n_padded, dtype=np.float64)
+
+        start = store.coordinates[store.control_ids["HH"]]
+        self.x[self.padded_offsets] = start[0]
+        self.y[self.padded_offsets] = start[1]
+
+        # every real row at once, the padded rows keep their start values
+        real_rows = np.ones(n_padded, dtype=bool)
+        real_rows[self.padded_offsets] = False
+        self.cumulative_time_ms[real_rows] = store.cumulative_time_ms
+        self.time_split_ms[real_rows] = store.time_split_ms
+        self.cumulative_points[real_rows] = store.cumulative_points
+        self.cumulative_distance[real_rows] = store.cumulative_distance
+        coordinates = store.coordinates[store.control_id]
+        self.x[real_rows] = coordinates[:, 0]
+        self.y[real_rows] = coordinates[:, 1]
+
+        # search keys over the real rows only, strictly increasing between teams
+        self.key_stride = int(self.cumulative_time_ms.max(initial=0)) + 2
+        team_of_row = np.repeat(np.arange(n_teams, dtype=np.int64), team_lengths)
+        self.search_keys = team_of_row * self.key_stride + self.cumulative_time_ms[real_rows]
+        self.team_key_base = np.arange(n_teams, dtype=np.int64) * self.key_stride
+
+    def reached_rows(self, t_event: float) -> np.ndarray:
+        """
+        Return the padded row index of the most recent control reached by each team at time t_event,
+        the virtual start row if no control has been reached yet
+
+        args:
+        - t_event: float representing the seconds elapsed since the start of the event
+        """
+        t_event_ms = min(int(t_event * 1000), self.key_stride - 1)
+        reached_count = np.searchsorted(self.search_keys, self.team_key_base + t_event_ms, side="left")
+        return self.padded_offsets + reached_count - self.offsets[:-1]
+
+    def positions(self, t_event: float) -> np.ndarray:
+        """
+        Return an (n_teams, 2) array of each team's interpolated pixel position at time t_event,
+        in the same order as team_numbers
+
+        args:
+        - t_event: float representing the seconds elapsed since the start of the event
+        """
+        prev_rows = self.reached_rows(t_event)
+        next_rows = np.minimum(prev_rows + 1, self.last_rows)
+
+        total_time_split = self.time_split_ms[next_rows]
+        elapsed_since_prev = int(t_event * 1000) - self.cumulative_time_ms[prev_rows]
+        time_frac = np.divide(elapsed_since_prev, total_time_split,
+                              out=np.zeros(len(prev_rows), dtype=np.float64),
+                              where=total_time_split != 0)
+
+        positions = np.empty((len(prev_rows), 2), dtype=np.int64)
+        positions[:, 0] = self.x[prev_rows] + (self.x[next_rows] - self.x[prev_rows]) * time_frac
+        positions[:, 1] = self.y[prev_rows] + (self.y[next_rows] - self.y[prev_rows]) * time_frac
+        return positions
+
+    def points(self, t_event: float) -> np.ndarray:
+        """
+        Return each team's cumulative points at time t_event, in the same order as team_numbers
+
+        args:
+        - t_event: float representing the seconds elapsed since the start of the event
+        """
+        return self.cumulative_points[self.reached_rows(t_event)]
+
+    def distances(self, t_event: float) -> np.ndarray:
+        """
+        Return each team's cumulative straight line distance in km at time t_event, in the same
+        order as team_numbers
+
+        args:
+        - t_event: float representing the seconds elapsed since the start of the event
+        """
+        return self.cumulative_distance[self.reached_rows(t_event)]
+
+    def distance_of(self, team_number: str, t_event: float) -> float:
+        """
+        Return a single team's cumulative straight line distance in km at time t_event,
+        0 if the team has no result
+
+        args:
+        - team_number: str representing the team
+        - t_event: float representing the seconds elapsed since the start of the event
+        """
+        team_idx = self.team_index.get(team_number)
+        if team_idx is None:
+            return 0.0
+        start_row = self.padded_offsets[team_idx]
+        team_times = self.cumulative_time_ms[start_row + 1:self.last_rows[team_idx] + 1]
+        reached_count = np.searchsorted(team_times, int(t_event * 1000), side="left")
+        return float(self.cumulative_distance[start_row + reached_count])
@@ -0,0 +1,261 @@
+import copy
+import queue
+import threading
+import time
+
+import numpy as np
+
+from results_plotter import frame_profiler
+from results_plotter import frame_scheduler
+
+class FrameBuffer:
+    """
+    A preallocated map canvas and stats canvas that frames are composed into and displayed from
+
+    Each buffer keeps the regions drawn over by its last frame, so composing the next frame into
+    it only restores those regions instead of copying the whole background
+    """
+    def __init__(self, map_shape: "tuple[int, ...]", stats_panel):
+        self.canvas_map = np.zeros(map_shape, dtype=np.uint8)
+        self.dirty_rects = []
+        # viewport version of the background under canvas_map, -1 until a background is drawn
+        self.view_version = -1
+        self.stats_panel = stats_panel.copy()
+        self.frame_num = -1
+
+class FrameJob:
+    """
+    Everything a worker needs to compose one frame, captured on the main thread when the frame is
+    requested so later key presses don't change frames already being drawn
+    """
+    def __init__(self, generation: int, frame_num: int, t_event: float, buffer: FrameBuffer, plotter):
+        self.generation = generation
+        self.frame_num = frame_num
+        self.t_event = t_event
+        self.buffer = buffer
+        self.viewport = copy.copy(plotter.viewport)
+        self.position_engine = plotter.position_engine
+        self.leaderboard = plotter.leaderboard
+        self.analytics = plotter.analytics
+        self.focus_team = plotter.config["team_number"]
+        self.density_mode = plotter.density_mode
+        self.render_quality = plotter.render_quality
+        self.playback_text = plotter.playback_text
+
+class FrameComposer:
+    """
+    A worker's own copy of the plotter state that changes while drawing a frame, sharing the
+    position engine, map pyramid and everything else that is only read
+    """
+    def __init__(self, plotter):
+        self.plotter = copy.copy(plotter)
+        # a shallow copy shares every attribute, so anything changed in place while drawing or by a
+        # live update on the main thread is copied
+        self.plotter.config = dict(plotter.config)
+        self.plotter.leaderboard = plotter.leaderboard.copy()
+        self.plotter.team_label_sizes = dict(plotter.team_label_sizes)
+        self.plotter.viewport = copy.copy(plotter.viewport)
+        self.plotter.dirty_rects = []
+        self.plotter.sorted_team_points = []
+        self.plotter.profiler = frame_profiler.FrameProfiler(False)
+        self.plotter.show_profile_hud = False
+        self.source_leaderboard = plotter.leaderboard
+
+    def compose(self, job: FrameJob) -> None:
+        """
+        Draw the frame of job into its buffer
+        """
+        worker_plotter = self.plotter
+        if job.leaderboard is not self.source_leaderboard:
+            # the results changed while following a live event
+            worker_plotter.position_engine = job.position_engine
+            worker_plotter.leaderboard = job.leaderboard.copy()
+            worker_plotter.analytics = job.analytics
+            self.source_leaderboard = job.leaderboard
+            worker_plotter._measure_team_labels([team for team in job.position_engine.team_numbers
+                                                 if team not in worker_plotter.team_label_sizes])
+        if job.focus_team != worker_plotter.config["team_number"]:
+            worker_plotter.set_focus_team(job.focus_team)
+        worker_plotter.density_mode = job.density_mode
+        worker_plotter.render_quality = job.render_quality
+        worker_plotter.playback_text = job.playback_text
+
+        worker_plotter.viewport = job.viewport
+        if worker_plotter.view_version != job.viewport.version:
+            worker_plotter._update_view()
+
+        buffer = job.buffer
+        if buffer.view_version != worker_plotter.view_version:
+            np.copyto(buffer.canvas_map, worker_plotter.view_background)
+            buffer.dirty_rects = []
+            buffer.view_version = worker_plotter.view_version
+        worker_plotter.canvas_map = buffer.canvas_map
+        worker_plotter.dirty_rects = buffer.dirty_rects
+        worker_plotter.stats_panel = buffer.stats_panel
+
+        worker_plotter.render_frame(job.t_event)
+        buffer.dirty_rects = worker_plotter.dirty_rects
+        buffer.frame_num = job.frame_num
+
+class RenderPipeline:
+    """
+    Compose frames of the replay ahead of time on worker threads, into a bounded pool of
+    preallocated buffers, and hand them back to the main thread in frame order
+
+    OpenCV drawing releases the GIL, so workers overlap with each other and with the main thread
+    displaying frames and handling keys. Up to queue_depth frames are in flight, trading latency
+    after a key press against smoothing out frames that are slow to compose. Seeking, changing
+    speed, moving the view or changing team discards the frames in flight, which are composed again.
+    An exception composing a frame is raised again from take_frame, as it would be drawing serially
+    """
+    def __init__(self, plotter, workers: int = 2, queue_depth: int = 3):
+        self.plotter = plotter
+        self.queue_depth = max(queue_depth, 1)
+        map_shape = (plotter.viewport.height, plotter.viewport.width, 3)
+        self.free_buffers = [FrameBuffer(map_shape, plotter.stats_panel) for _ in range(self.queue_depth)]
+
+        self.jobs = queue.Queue()
+        self.condition = threading.Condition()
+        self.finished = {}
+        self.generation = 0
+        self.next_request = 0
+        # the playback clock and view the frames in flight were requested for
+        self.request_state = None
+        self.frames_late = 0
+        # moving average of the wall time a worker takes to compose a frame
+        self.compose_time = 0.0
+        # the first exception raised composing a frame, raised again on the main thread by take_frame
+        self.worker_error = None
+        self.stopping = False
+        self.threads = [threading.Thread(target=self._run_worker, args=(FrameComposer(plotter),),
+                                         name=f"render-worker-{worker_num}", daemon=True)
+                        for worker_num in range(max(workers, 1))]
+        for thread in self.threads:
+            thread.start()
+
+    def request_frames(self, scheduler: frame_scheduler.FrameScheduler) -> None:
+        """
+        Request the frames due next from the scheduler, as many as there are free buffers
+        """
+        request_state = (scheduler.clock_wall_time, scheduler.clock_sim_time, scheduler.rate, scheduler.paused,
+                         self.plotter.viewport.version, self.plotter.density_mode,
+                         self.plotter.config["team_number"], id(self.plotter.leaderboard))
+        with self.condition:
+            if request_state != self.request_state:
+                self.invalidate()
+                self.request_state = request_state
+            self.next_request = max(self.next_request, scheduler.frame_num)
+            while self.free_buffers:
+                wall_time = scheduler.start_time + self.next_request / scheduler.fps
+                sim_time = scheduler.sim_time_at(wall_time)
+                if sim_time >= scheduler.sim_length:
+                    break
+                t_event = max(sim_time, 0.0) / self.plotter.event_time_scale(scheduler.sim_length)
+                job = FrameJob(self.generation, self.next_request, t_event, self.free_buffers.pop(), self.plotter)
+                self.jobs.put(job)
+                self.next_request += 1
+
+    def take_frame(self, frame_num: int, timeout: float) -> "FrameBuffer | None":
+        """
+        Wait up to timeout seconds for frame_num to be composed
+        Returns the buffer of frame_num, or of the latest earlier frame if it isn't ready in time, to be
+        handed back with release once displayed. None if no frame up to frame_num is ready
+        Raises the exception of a worker that failed to compose a frame
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: frame_num in self.finished or self.worker_error is not None, timeout)
+            if self.worker_error is not None:
+                raise self.worker_error
+            if frame_num not in self.finished:
+                self.frames_late += 1
+
+            # frames are only shown in order, so every earlier frame is discarded
+            ready_nums = [num for num in self.finished if num <= frame_num]
+            if not ready_nums:
+                return None
+            shown_num = max(ready_nums)
+            for ready_num in ready_nums:
+                if ready_num != shown_num:
+                    self.free_buffers.append(self.finished.pop(ready_num))
+            return self.finished.pop(shown_num)
+
+    def release(self, buffer: FrameBuffer) -> None:
+        """
+        Return a displayed buffer to the pool
+        """
+        with self.condition:
+            self.free_buffers.append(buffer)
+
+    def invalidate(self) -> None:
+        """
+        Discard every frame requested so far, after the replay time or view has changed
+        """
+        with self.condition:
+            self.generation += 1
+            self.free_buffers.extend(self.finished.values())
+            self.finished = {}
+            while True:
+                try:
+                    self.free_buffers.append(self.jobs.get_nowait().buffer)
+                except queue.Empty:
+                    break
+            self.next_request = 0
+
+    def stop(self) -> None:
+        """
+        Stop the workers once they finish the frames they are composing
+        """
+        with self.condition:
+            self.stopping = True
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def frame_cost(self) -> float:
+        """
+        Return the average wall time per frame the pipeline can sustain, composing as many frames
+        at once as there are workers or buffers
+        """
+        with self.condition:
+            return self.compose_time / min(len(self.threads), self.queue_depth)
+
+    def summary(self) -> str:
+        """
+        Return a one line summary of the pipeline settings and frames not ready in time
+        """
+        return (f"Composed on {len(self.threads)} threads, {self.queue_depth} frames in flight, "
+                f"{self.frames_late} frames late")
+
+    def _run_worker(self, composer: FrameComposer) -> None:
+        """
+        Compose requested frames until stopped
+        """
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self.condition:
+                stale = job.generation != self.generation or self.stopping
+            if not stale:
+                compose_start = time.monotonic()
+                try:
+                    composer.compose(job)
+                except Exception as error:
+                    # hand the buffer back and let the main thread fail as it would drawing serially
+                    with self.condition:
+                        if self.worker_error is None:
+                            self.worker_error = error
+                        self.free_buffers.append(job.buffer)
+                        self.condition.notify_all()
+                    continue
+                compose_time = time.monotonic() - compose_start
+
+            with self.condition:
+                if not stale:
+                    self.compose_time += 0.1 * (compose_time - self.compose_time)
+                if job.generation == self.generation and not self.stopping:
+                    self.finished[job.frame_num] = job.buffer
+                    self.condition.notify_all()
+                else:
+                    self.free_buffers.append(job.buffer)
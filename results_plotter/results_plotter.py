@@ -1,4 +1,5 @@
 import datetime
+import os
 import re
 import time
 
@@ -6,6 +7,17 @@ import cv2
 import numpy as np
 import pandas as pd
 
+from results_analytics import results_analytics
+from results_plotter import baked_trajectory
+from results_plotter import frame_profiler
+from results_plotter import frame_scheduler
+from results_plotter import leaderboard
+from results_plotter import live_follow
+from results_plotter import map_view
+from results_plotter import position_engine
+from results_plotter import render_pipeline
+from results_plotter import stats_panel
+from results_reader import event_store
 from utils import PixelCoordinate
 
 class ResultsPlotter:
@@ -15,14 +27,67 @@ class ResultsPlotter:
     def __init__(self, config: dict,
                  results: "dict[str, pd.Dataframe]",
                  control_coordinates: "dict[str, PixelCoordinate]",
-                 leg_statistics: pd.DataFrame):
+                 leg_statistics: pd.DataFrame,
+                 trajectory: "baked_trajectory.TrajectoryFile | None" = None):
         self.config = config
         self.results = results
         self.control_coordinates = control_coordinates
         self.leg_statistics = leg_statistics
-        self.original_map = cv2.imread(self.config["map_file"])
-        self.canvas_map = self.original_map.copy()
         self.sorted_team_points = []
+        if trajectory is not None:
+            # play back from baked frames, without the results
+            self.position_engine, self.leaderboard = trajectory.load(self.config["team_number"])
+            store = None
+        else:
+            # every team's results packed once, for the position engine and the pace analytics
+            store = event_store.EventStore.from_results(self.results or {}, self.control_coordinates)
+            self.position_engine = position_engine.PositionEngine.from_store(store)
+            self.leaderboard = leaderboard.Leaderboard(self.position_engine, self.config["team_number"])
+        # the pace of the focus team, from the analytics tables if current, None if baked without them
+        self.analytics = results_analytics.ResultsAnalytics.for_replay(self.config, store)
+
+        # controls never move, so draw them once onto the map as read, keeping no undrawn copy
+        self.control_layer_map = self.add_control_locations(cv2.imread(self.config["map_file"]))
+        self.map_pyramid = map_view.MapPyramid(self.control_layer_map)
+
+        # only the area of the map in the viewport is rendered, at the size it is displayed
+        map_height, map_width = self.control_layer_map.shape[:2]
+        display_size = map_view.fit_size(map_width, map_height,
+                                         self.config.get("display_width", 1600),
+                                         self.config.get("display_height", 1200))
+        self.viewport = map_view.Viewport(map_width, map_height, *display_size)
+        self.view_version = -1
+        self.view_background = None
+        self.canvas_map = None
+        # regions of canvas_map drawn over by team icons since it last matched view_background
+        self.dirty_rects = []
+        # 2: every team labelled, 1: only highlighted teams labelled, 0: other teams drawn as small dots
+        self.render_quality = 2
+        # with many teams, draw a density heatmap of every team and markers for highlighted teams only
+        density_mode = self.config.get("density_mode", "auto")
+        if density_mode == "auto":
+            density_mode = len(self.position_engine.team_numbers) > self.config.get("density_threshold", 500)
+        self.density_mode = bool(density_mode)
+        self.density_cell_size = int(self.config.get("density_cell_size", 12))
+        self.density_opacity = float(self.config.get("density_opacity", 0.7))
+        self._update_view()
+
+        # stats are drawn onto the same canvas every frame, only values that change are redrawn
+        self.stats_panel = stats_panel.StatsPanel(800, 800)
+        self.stats_title_line = self.stats_panel.add_line("Stats for team ", (50, 50))
+        self.stats_clock_line = self.stats_panel.add_line("Time since event started: ", (50, 100))
+        self.stats_distance_line = self.stats_panel.add_line("Straight line distance travelled: ", (50, 150))
+        self.stats_place_lines = [self.stats_panel.add_line(f"{position_to_text(place)} place: ", (50, 150 + 50 * place))
+                                  for place in range(1, 4)]
+        self.stats_focus_line = self.stats_panel.add_line("", (50, 350))
+        self.stats_pace_line = self.stats_panel.add_line("Pace: ", (50, 400))
+        self.stats_playback_line = self.stats_panel.add_line("", (50, 450))
+        # speed and direction of the live replay, shown under the stats
+        self.playback_text = ""
+
+        # per stage frame timings, off unless enabled in the config
+        self.profiler = frame_profiler.FrameProfiler(self.config.get("profile", False))
+        self.show_profile_hud = self.profiler.enabled and self.config.get("profile_hud", False)
 
     def plot_results(self) -> None:
         """
@@ -34,133 +99,308 @@ class ResultsPlotter:
         stats_window_name = "Summary Stats Window"
         cv2.namedWindow(stats_window_name, cv2.WINDOW_NORMAL)
 
-        curr_sim_time = 0.0 # secs
-        sim_length = 30 # secs
-        curr_event_time = 0.0   # hrs
-        event_length = self.config["event_length"]  # hours
-        # scale: unitless, + 0.5 to account for late arrivals
-        scale = (sim_length/3600) / (event_length + 0.5)
-        fps = 20    # frames per sec
-        dt = 1/fps
+        sim_length = float(self.config.get("replay_duration", 30)) # secs
+        scale = self.event_time_scale(sim_length)
+        fps = float(self.config.get("replay_fps", 20))    # frames per sec
+
+        # follow the event as results arrive, parsing them on a background thread
+        watcher = None
+        if self.config.get("live_follow", False):
+            watcher = live_follow.ResultsWatcher(self.config, self.control_coordinates)
+            watcher.start()
+
+        # compose frames ahead on worker threads, unless profiling which times each stage in this thread
+        pipeline = None
+        render_workers = int(self.config.get("render_workers", min(2, os.cpu_count() or 1)))
+        if render_workers > 0 and not self.profiler.enabled:
+            pipeline = render_pipeline.RenderPipeline(self, render_workers,
+                                                      int(self.config.get("render_queue_depth", 3)))
+
+        scheduler = frame_scheduler.FrameScheduler(sim_length, fps, max_quality=2)
+        scheduler.start()
+        while True:
+            curr_sim_time = scheduler.next_frame()
+            if curr_sim_time is None:
+                break
 
-        while curr_sim_time < sim_length:
-            # start with blank canvas for stats
-            stats_width, stats_height = 800, 800
-            stats_background = np.ones((stats_width, stats_height, 3))
-            stats_background = self.add_stats_text(stats_background, curr_event_time)
-            self.canvas_map = self.add_teams_location(self.canvas_map, curr_event_time)
-            self.canvas_map = self.add_control_locations(self.canvas_map)
+            self.profiler.begin_frame()
+            if watcher is not None:
+                update = watcher.take_update()
+                if update is not None:
+                    self.apply_live_update(update)
+            self.render_quality = scheduler.quality
+            self.playback_text = playback_status(scheduler)
+            if pipeline is not None:
+                # show the frame once composed, or the latest before it if it isn't ready by the next frame
+                pipeline.request_frames(scheduler)
+                frame_buffer = pipeline.take_frame(scheduler.frame_num, scheduler.frame_budget)
+                if frame_buffer is not None:
+                    cv2.imshow(map_window_name, frame_buffer.canvas_map)
+                    cv2.imshow(stats_window_name, frame_buffer.stats_panel.canvas)
+                    pipeline.release(frame_buffer)
+            else:
+                canvas_map, stats_background = self.render_frame(curr_sim_time/scale)
 
-            cv2.imshow(map_window_name, self.canvas_map)
-            cv2.imshow(stats_window_name, stats_background)
+                with self.profiler.stage("imshow"):
+                    cv2.imshow(map_window_name, canvas_map)
+                    cv2.imshow(stats_window_name, stats_background)
 
-            k = cv2.waitKey(1) & 0xFF
+            with self.profiler.stage("waitKey"):
+                k = cv2.waitKey(1) & 0xFF
             if k == 27:
                 break
+            if not self.handle_playback_key(k, scheduler):
+                self.handle_view_key(k)
+
+            # quality follows the cost of composing frames, not the time spent waiting for them
+            scheduler.frame_done(pipeline.frame_cost() if pipeline is not None else None)
+            with self.profiler.stage("sleep"):
+                scheduler.wait()
+            self.profiler.end_frame()
+
+        if watcher is not None:
+            watcher.stop()
+        print(scheduler.summary())
+        if pipeline is not None:
+            pipeline.stop()
+            print(pipeline.summary())
+        self.report_profile()
+        cv2.destroyAllWindows()
+
+    def report_profile(self) -> None:
+        """
+        Print the per stage timing summary and write the trace, if profiling is enabled
+        """
+        if not self.profiler.enabled:
+            return
 
-            curr_sim_time += dt
-            curr_event_time += dt/scale
+        print(self.profiler.summary_text())
+        trace_path = self.config.get("profile_trace")
+        if trace_path:
+            self.profiler.write_trace(trace_path)
 
-            # reset canvas map
-            self.canvas_map = self.original_map.copy()
+    def set_focus_team(self, team_number: str) -> None:
+        """
+        Make another team the focus of the stats and highlighted on the map, reusing everything
+        already built for the event
+        """
+        self.config["team_number"] = team_number
+        self.leaderboard.set_focus_team(team_number)
 
-            time.sleep(dt)
+    def event_time_scale(self, sim_length: float) -> float:
+        """
+        Return the ratio of replay time to event time for a replay lasting sim_length seconds
 
-        cv2.destroyAllWindows()
+        args:
+        - sim_length: float representing the length of the replay in seconds
+        """
+        event_length = self.config["event_length"]  # hours
+        # scale: unitless, + 0.5 to account for late arrivals
+        return (sim_length/3600) / (event_length + 0.5)
+
+    def render_frame(self, t_event: float) -> "tuple[np.ndarray, np.ndarray]":
+        """
+        Draw the map and stats for a single frame of the replay, without displaying them
+        Returns the map canvas and the stats canvas
 
-    def add_stats_text(self, stats_background: np.ndarray, t_event: float) -> np.ndarray:
+        args:
+        - t_event: float representing the seconds elapsed since the start of the event
         """
-        Add the text to be display on the stats window, including:
+        # reset canvas map
+        with self.profiler.stage("map_reset"):
+            if self.view_version != self.viewport.version:
+                self._update_view()
+            else:
+                self.restore_dirty_rects()
+
+        with self.profiler.stage("add_stats_text"):
+            stats_background = self.add_stats_text(t_event)
+
+        with self.profiler.stage("add_teams_location"):
+            if self.density_mode:
+                self.canvas_map = self.add_teams_density(self.canvas_map, t_event)
+            else:
+                self.canvas_map = self.add_teams_location(self.canvas_map, t_event)
+
+        if self.show_profile_hud:
+            self.add_profile_hud(self.canvas_map)
+
+        return self.canvas_map, stats_background
+
+    def add_profile_hud(self, canvas_map: np.ndarray) -> np.ndarray:
+        """
+        Overlay the recent fps and stage timings in the top left corner of the map
+
+        args:
+        - canvas_map: numpy array representing the rogaining map
+        """
+        hud_font_settings = {
+            "fontFace": cv2.FONT_HERSHEY_SIMPLEX,
+            "fontScale": 0.5,
+            "color": (0, 0, 255),
+            "thickness": 1,
+        }
+        lines = self.profiler.hud_lines()
+        line_height = 18
+        hud_width = 260
+        hud_height = line_height * len(lines) + 8
+        cv2.rectangle(canvas_map, (0, 0), (hud_width, hud_height), (255, 255, 255), -1)
+        for line_num, line in enumerate(lines):
+            cv2.putText(canvas_map, line, (5, line_height * (line_num + 1)), **hud_font_settings)
+
+        self.dirty_rects.append(self._clip_rect(0, 0, hud_width + 1, hud_height + 1))
+        return canvas_map
+
+    def restore_dirty_rects(self) -> None:
+        """
+        Copy the static background back over the regions of canvas_map drawn on by team icons
+        """
+        for x0, y0, x1, y1 in self.dirty_rects:
+            self.canvas_map[y0:y1, x0:x1] = self.view_background[y0:y1, x0:x1]
+        self.dirty_rects = []
+
+    def _update_view(self) -> None:
+        """
+        Render the background for the current viewport from the map pyramid and scale the team
+        icons to match it
+        """
+        self.view_background = self.map_pyramid.render(self.viewport)
+        self.canvas_map = self.view_background.copy()
+        self.dirty_rects = []
+
+        # icons keep the same size relative to the map as at full resolution
+        view_scale = self.viewport.scale
+        self.team_icon_radius = max(3, round(20 * view_scale))
+        self.team_font_scale = max(0.3, view_scale)
+        self.team_font_thickness = max(1, round(2 * view_scale))
+        self.team_label_sizes = {}
+        self._measure_team_labels(self.position_engine.team_numbers)
+
+        self.view_version = self.viewport.version
+
+    def _measure_team_labels(self, teams: "list[str]") -> None:
+        """
+        Cache the size of each team's label at the current icon scale
+        """
+        for team in teams:
+            text_size, baseline = cv2.getTextSize(team, cv2.FONT_HERSHEY_SIMPLEX,
+                                                  self.team_font_scale, self.team_font_thickness)
+            self.team_label_sizes[team] = (text_size, baseline)
+
+    def apply_live_update(self, update: live_follow.LiveUpdate) -> None:
+        """
+        Swap in the results, position engine and leaderboard rebuilt by the results watcher
+        """
+        self.results = update.results
+        self.position_engine = update.position_engine
+        self.leaderboard = update.leaderboard
+        self.analytics = update.analytics
+        self.leaderboard.set_focus_team(self.config["team_number"])
+        self._measure_team_labels([team for team in self.position_engine.team_numbers
+                                   if team not in self.team_label_sizes])
+
+    def handle_playback_key(self, k: int, scheduler: frame_scheduler.FrameScheduler) -> bool:
+        """
+        Control playback from a key press
+        space pauses, j/l jump back/forward 5% of the replay, 0-9 jump to 0-90% of the replay,
+        [ or ] halves or doubles the speed, r reverses the direction of play
+        Returns whether the key was a playback key
+
+        args:
+        - k: int representing the key code returned by cv2.waitKey
+        - scheduler: FrameScheduler timing the replay
+        """
+        if k == ord(" "):
+            scheduler.toggle_pause()
+        elif k in (ord("j"), ord("l")):
+            step = 0.05 * scheduler.sim_length
+            scheduler.seek(scheduler.current_sim_time() + (step if k == ord("l") else -step))
+        elif ord("0") <= k <= ord("9"):
+            scheduler.seek((k - ord("0")) / 10 * scheduler.sim_length)
+        elif k in (ord("["), ord("]")):
+            factor = 2 if k == ord("]") else 0.5
+            speed = min(max(abs(scheduler.rate) * factor, 1 / 16), 16)
+            scheduler.set_rate(speed if scheduler.rate > 0 else -speed)
+        elif k == ord("r"):
+            scheduler.set_rate(-scheduler.rate)
+        else:
+            return False
+        return True
+
+    def handle_view_key(self, k: int) -> None:
+        """
+        Zoom and pan the map view from a key press
+        + or = zooms in, - zooms out, w/a/s/d pans up/left/down/right, h toggles the density heatmap
+
+        args:
+        - k: int representing the key code returned by cv2.waitKey
+        """
+        if k in (ord("+"), ord("=")):
+            self.viewport.zoom_by(1.25)
+        elif k == ord("-"):
+            self.viewport.zoom_by(0.8)
+        elif k == ord("w"):
+            self.viewport.pan(0, -0.1)
+        elif k == ord("a"):
+            self.viewport.pan(-0.1, 0)
+        elif k == ord("s"):
+            self.viewport.pan(0, 0.1)
+        elif k == ord("d"):
+            self.viewport.pan(0.1, 0)
+        elif k == ord("h"):
+            self.density_mode = not self.density_mode
+
+    def add_stats_text(self, t_event: float) -> np.ndarray:
+        """
+        Update the text displayed on the stats window, including:
          - the title
          - event elapsed time
          - cumulative points
          - overall leading team
          - distance travelled
+        Returns the stats canvas, which is reused by every frame
 
         args:
-        - stats_background: numpy array representing the area that stats can be written onto
         - t_event: float representing seconds since start of event
         """
-        stats_font_settings = {
-            "fontFace": cv2.FONT_HERSHEY_SIMPLEX,
-            "fontScale": 1,
-            "color": (255, 0, 0),
-            "thickness": 2,
-            "lineType": 2
-        }
+        panel = self.stats_panel
 
         # stats page title
         team_number = self.config["team_number"]
-        cv2.putText(stats_background, f"Stats for team {team_number}",
-                    (50, 50),
-                    **stats_font_settings
-                    )
+        panel.set_value(self.stats_title_line, team_number)
 
         # event duration clock
-        t_event_timedelta = datetime.timedelta(seconds=t_event)
-        event_elapsed_text = str(t_event_timedelta)
-        cv2.putText(stats_background, f"Time since event started: {event_elapsed_text} hrs",
-                    (50, 100),
-                    **stats_font_settings
-                    )
+        event_elapsed_text = str(datetime.timedelta(seconds=t_event))
+        panel.set_value(self.stats_clock_line, f"{event_elapsed_text} hrs")
 
         # distance travelled
-        dist_travelled = 0
-        # rows for which at a given t_event time into the event, have already passed
-        team_result = self.results[team_number]
-        controls_reached = team_result[team_result.cumulative_time < t_event_timedelta]
-        # get most recent row
-        recent_control_row = controls_reached.tail(1)
-        if not recent_control_row.empty:
-            dist_travelled = recent_control_row.cumulative_distance.values[0]
-        else:
-            dist_travelled = 0
-        dist_travelled_text = f"Straight line distance travelled: {dist_travelled:.2f} km"
-        cv2.putText(stats_background, dist_travelled_text,
-                    (50, 150),
-                    **stats_font_settings
-                    )
+        dist_travelled = self.position_engine.distance_of(team_number, t_event)
+        panel.set_value(self.stats_distance_line, f"{dist_travelled:.2f} km")
 
         # top 3 teams
-        self.sorted_team_points = self._get_leading_teams(t_event)
-
-        first_team_number, first_team_points = self.sorted_team_points[0]
-        first_team_text = f"1st place: Team {first_team_number}, {first_team_points} pts"
-        cv2.putText(stats_background, first_team_text,
-                    (50, 200),
-                    **stats_font_settings
-                    )
-
-        second_team_number, second_team_points = self.sorted_team_points[1]
-        second_team_text = f"2nd place: Team {second_team_number}, {second_team_points} pts"
-        cv2.putText(stats_background, second_team_text,
-                    (50, 250),
-                    **stats_font_settings
-                    )
-
-        third_team_number, third_team_points = self.sorted_team_points[2]
-        third_team_text = f"3rd place: Team {third_team_number}, {third_team_points} pts"
-        cv2.putText(stats_background, third_team_text,
-                    (50, 300),
-                    **stats_font_settings
-                    )
+        self.leaderboard.seek(t_event)
+        self.sorted_team_points = self.leaderboard.top_teams
+        for place_line, (place_team_number, place_team_points) in zip(self.stats_place_lines, self.sorted_team_points):
+            panel.set_value(place_line, f"Team {place_team_number}, {place_team_points} pts")
 
         # cumulative points
-        overall_position = 0
-        cumulative_points = 0
-        for position, (sorted_team_number, sorted_points) in enumerate(self.sorted_team_points):
-            if sorted_team_number == team_number:
-                overall_position = position + 1
-                cumulative_points = sorted_points
+        overall_position = self.leaderboard.focus_position
+        cumulative_points = self.leaderboard.focus_points
 
         position_text = position_to_text(overall_position)
-        cumulative_points_text = f"{position_text} place: Team {team_number}, {cumulative_points} pts"
-        cv2.putText(stats_background, cumulative_points_text,
-                    (50, 350),
-                    **stats_font_settings
-                    )
+        panel.set_value(self.stats_focus_line, f"{position_text} place: Team {team_number}, {cumulative_points} pts")
+
+        # points per hour so far, and the speed and split rank of the last leg finished
+        points_per_hour = cumulative_points / (t_event / 3600) if t_event > 0 else 0
+        pace_text = f"{points_per_hour:.0f} pts/hr"
+        last_leg = self.analytics.last_leg(team_number, t_event) if self.analytics is not None else None
+        if last_leg is not None:
+            leg_speed, split_rank, leg_count = last_leg
+            pace_text += f", last leg {leg_speed:.1f} km/h, {position_to_text(split_rank)} of {leg_count}"
+        panel.set_value(self.stats_pace_line, pace_text)
+        panel.set_value(self.stats_playback_line, self.playback_text)
 
-        return stats_background
+        return panel.canvas
 
     def add_teams_location(self, canvas_map: np.ndarray, t_event: float) -> np.ndarray:
         """
@@ -170,84 +410,127 @@ class ResultsPlotter:
         - canvas_map: numpy array representing the rogaining map
         - t_event: float representing the seconds elapsed since the start of the event
         """
-        t_event_timedelta = datetime.timedelta(seconds=t_event)
-        for team, result in self.results.items():
-            df = result
+        team_positions = self.viewport.to_view(self.position_engine.positions(t_event))
+        view_height, view_width = canvas_map.shape[:2]
+        margin = 4 * self.team_icon_radius
+        for team, (pos_x, pos_y) in zip(self.position_engine.team_numbers, team_positions.tolist()):
+            # skip teams outside the visible area of the map
+            if pos_x < -margin or pos_y < -margin or pos_x > view_width + margin or pos_y > view_height + margin:
+                continue
+            self._draw_team(canvas_map, team, pos_x, pos_y)
 
-            prev_control = ""
-            next_control = ""
-            controls_reached = df[df.cumulative_time < t_event_timedelta]
-            # get most recent row
-            recent_control_row = controls_reached.tail(1)
+        return canvas_map
 
-            # get previous control
-            if not recent_control_row.empty:
-                prev_control_row = recent_control_row
-            else:
-                prev_control_row = pd.DataFrame(
-                    [["HH",  # control
-                    0, # cumulative_points
-                    datetime.timedelta(seconds=0), # time_split
-                    0.0, # distance
-                    datetime.timedelta(seconds=0), # cumulative_time
-                    0.0]],    # cumulative_distance
-                    columns=["control", "cumulative_points", "time_split", "distance", "cumulative_time", "cumulative_distance"])
-
-            prev_control = prev_control_row.control.values[0]
-
-            # get next control index
-            prev_control_idx = -1
-            if not recent_control_row.empty:
-                prev_control_idx = recent_control_row.index.values[0]
-
-            # get next control row
-            if prev_control_idx + 1 < len(df):
-                next_control_row = df.iloc[[prev_control_idx + 1]]
-            else:
-                next_control_row = df.iloc[[-1]]
+    def add_teams_density(self, canvas_map: np.ndarray, t_event: float) -> np.ndarray:
+        """
+        Blend a colour mapped density of every team's position over the map, and add team icons
+        for the focus team and the top 3 teams only
 
-            # get next control
-            next_control = next_control_row.control.values[0]
+        args:
+        - canvas_map: numpy array representing the rogaining map
+        - t_event: float representing the seconds elapsed since the start of the event
+        """
+        team_positions = self.viewport.to_view(self.position_engine.positions(t_event))
+        view_height, view_width = canvas_map.shape[:2]
+        cell_size = self.density_cell_size
+        grid_width = -(-view_width // cell_size)
+        grid_height = -(-view_height // cell_size)
+
+        # count the teams in each cell of a grid over the view
+        in_view = ((team_positions[:, 0] >= 0) & (team_positions[:, 0] < view_width) &
+                   (team_positions[:, 1] >= 0) & (team_positions[:, 1] < view_height))
+        cells = team_positions[in_view] // cell_size
+        counts = np.bincount(cells[:, 1] * grid_width + cells[:, 0], minlength=grid_width * grid_height)
+        counts = counts.reshape(grid_height, grid_width)
+
+        occupied_rows = np.flatnonzero(counts.any(axis=1))
+        occupied_cols = np.flatnonzero(counts.any(axis=0))
+        if len(occupied_rows):
+            # only the bounding box of the occupied cells is coloured and blended
+            cy0, cy1 = occupied_rows[0], occupied_rows[-1] + 1
+            cx0, cx1 = occupied_cols[0], occupied_cols[-1] + 1
+            x0, y0 = cx0 * cell_size, cy0 * cell_size
+            x1, y1 = min(cx1 * cell_size, view_width), min(cy1 * cell_size, view_height)
+
+            # log scale, so cells with a few teams stay visible next to crowded controls
+            density = np.log1p(counts[cy0:cy1, cx0:cx1].astype(np.float32))
+            density *= 255 / np.log1p(counts.max())
+            density = cv2.resize(density.astype(np.uint8), ((cx1 - cx0) * cell_size, (cy1 - cy0) * cell_size),
+                                 interpolation=cv2.INTER_LINEAR)[:y1 - y0, :x1 - x0]
+            density_colour = cv2.applyColorMap(density, cv2.COLORMAP_JET)
+
+            # occupied cells are close to fully opaque, fading out only towards empty cells
+            alpha = np.minimum(density.astype(np.float32) * (4 / 255), 1) * self.density_opacity
+            region = canvas_map[y0:y1, x0:x1]
+            region[:] = cv2.blendLinear(region, density_colour, 1 - alpha, alpha)
+            self.dirty_rects.append((x0, y0, x1, y1))
+
+        margin = 4 * self.team_icon_radius
+        highlighted_teams = [self.config["team_number"]] + [team for team, _points in self.sorted_team_points[:3]]
+        for team in dict.fromkeys(highlighted_teams):
+            team_idx = self.position_engine.team_index.get(team)
+            if team_idx is None:
+                continue
+            pos_x, pos_y = team_positions[team_idx].tolist()
+            if pos_x < -margin or pos_y < -margin or pos_x > view_width + margin or pos_y > view_height + margin:
+                continue
+            self._draw_team(canvas_map, team, pos_x, pos_y)
 
-            prev_control_px = self.control_coordinates[prev_control]
-            next_control_px = self.control_coordinates[next_control]
+        return canvas_map
 
-            t_event_timedelta_np = np.array([t_event_timedelta], dtype="timedelta64[ms]")[0]
-            total_time_split_between_controls = next_control_row.time_split.values[0]
-            time_start_at_prev_control = prev_control_row.cumulative_time.values[0]
-            curr_time_delta_between_controls = t_event_timedelta_np - time_start_at_prev_control
-            if total_time_split_between_controls != np.timedelta64(0):
-                time_frac = curr_time_delta_between_controls / total_time_split_between_controls
-            else:
-                time_frac = 0
-            interp_pt_px_x = prev_control_px.x + ((next_control_px.x - prev_control_px.x) * time_frac)
-            interp_pt_px_y = prev_control_px.y + ((next_control_px.y - prev_control_px.y) * time_frac)
-            interpolated_pt_px = PixelCoordinate(int(interp_pt_px_x), int(interp_pt_px_y))
-
-            circle_colour = (0, 0, 0)
-            if team == self.config["team_number"]:
-                circle_colour = (0, 120, 50)
-            elif team == self.sorted_team_points[0][0]:
-                circle_colour = (0, 221, 255)
-            elif team == self.sorted_team_points[1][0]:
-                circle_colour = (173, 169, 170)
-            elif team == self.sorted_team_points[2][0]:
-                circle_colour = (50, 127, 205)
-
-            cv2.circle(canvas_map, (interpolated_pt_px.x, interpolated_pt_px.y), 20, circle_colour, -1)
+    def _draw_team(self, canvas_map: np.ndarray, team: str, pos_x: int, pos_y: int) -> None:
+        """
+        Draw a single team icon and label at the view coordinates, coloured by whether it is the focus
+        team or in the top 3
+        """
+        interpolated_pt_px = PixelCoordinate(pos_x, pos_y)
+
+        circle_colour = (0, 0, 0)
+        if team == self.config["team_number"]:
+            circle_colour = (0, 120, 50)
+        elif team == self.sorted_team_points[0][0]:
+            circle_colour = (0, 221, 255)
+        elif team == self.sorted_team_points[1][0]:
+            circle_colour = (173, 169, 170)
+        elif team == self.sorted_team_points[2][0]:
+            circle_colour = (50, 127, 205)
+
+        # highlighted teams are always drawn in full, other teams in less detail at lower quality
+        highlighted = circle_colour != (0, 0, 0)
+        radius = self.team_icon_radius
+        if self.render_quality == 0 and not highlighted:
+            radius = self.team_icon_radius // 2
+        cv2.circle(canvas_map, (interpolated_pt_px.x, interpolated_pt_px.y), radius, circle_colour, -1)
+        half_width = half_height = radius + 2
+
+        if self.render_quality == 2 or highlighted:
             team_font_settings = {
                 "text": team,
                 "fontFace": cv2.FONT_HERSHEY_SIMPLEX,
-                "fontScale": 1,
-                "thickness": 2,
+                "fontScale": self.team_font_scale,
+                "thickness": self.team_font_thickness,
             }
 
-            text_size, _ = cv2.getTextSize(**team_font_settings)
+            text_size, baseline = self.team_label_sizes[team]
             text_origin = (int(interpolated_pt_px.x - text_size[0] / 2), int(interpolated_pt_px.y + text_size[1] / 2))
 
             cv2.putText(img=canvas_map, org=text_origin, color=(255, 255, 255), **team_font_settings)
+            half_width = max(radius, text_size[0] // 2) + 2
+            half_height = max(radius, text_size[1] // 2 + baseline) + 2
 
-        return canvas_map
+        # record the area covered by the icon and its label so it can be restored next frame
+        self.dirty_rects.append(self._clip_rect(interpolated_pt_px.x - half_width,
+                                                interpolated_pt_px.y - half_height,
+                                                interpolated_pt_px.x + half_width + 1,
+                                                interpolated_pt_px.y + half_height + 1))
+
+    def _clip_rect(self, x0: int, y0: int, x1: int, y1: int) -> "tuple[int, int, int, int]":
+        """
+        Clip a rectangle to the bounds of the map view
+        """
+        map_height, map_width = self.view_background.shape[:2]
+        return (min(max(x0, 0), map_width), min(max(y0, 0), map_height),
+                min(max(x1, 0), map_width), min(max(y1, 0), map_height))
 
     def _get_leading_teams(self, t_event: float) -> "list[tuple[str, int]]":
         """
@@ -256,21 +539,8 @@ class ResultsPlotter:
         args
         - t_event: float representing seconds elapsed since start of the event
         """
-        team_points = []
-        for team_number, result in self.results.items():
-            t_event_timedelta = datetime.timedelta(seconds=t_event)
-            # rows for which at a given t_event time into the event, have already passed
-            elapsed_times_rows = result[result.cumulative_time < t_event_timedelta]
-            # get most recent row
-            recent_elapsed_row = elapsed_times_rows.tail(1)
-            if not recent_elapsed_row.empty:
-                points = recent_elapsed_row.cumulative_points.values[0]
-            else:
-                points = 0
-            team_points.append(tuple([team_number, points]))
-
-        sorted_by_points = list(reversed(sorted(team_points, key=lambda tup: tup[1])))
-        return sorted_by_points
+        self.leaderboard.seek(t_event)
+        return self.leaderboard.standings()
 
     def add_control_locations(self, canvas_map: np.ndarray) -> np.ndarray:
         """
@@ -304,10 +574,11 @@ class ResultsPlotter:
         leg_stats_window_name = "Leg Statistics"
         cv2.namedWindow(leg_stats_window_name, cv2.WINDOW_NORMAL)
 
+        # reset canvas map
+        self.canvas_map = self.control_layer_map.copy()
+
         leg_stats = self.leg_statistics.set_index("leg")["leg_count"].to_dict()
         for leg, visit_count in leg_stats.items():
-            self.canvas_map = self.add_control_locations(self.canvas_map)
-
             start_control, end_control = leg.split(":")
 
             start_control_px = self.control_coordinates[start_control]
@@ -337,11 +608,23 @@ class ResultsPlotter:
             cv2.imshow(leg_stats_window_name, self.canvas_map)
 
             # reset canvas map
-            self.canvas_map = self.original_map.copy()
+            self.canvas_map = self.control_layer_map.copy()
             k = cv2.waitKey(1) & 0xFF
             if k == 27:
                 break
 
+def playback_status(scheduler: frame_scheduler.FrameScheduler) -> str:
+    """
+    Return a description of the replay speed and direction, e.g. "Playback: 2x reverse, paused"
+    """
+    speed = abs(scheduler.rate)
+    speed_text = f"{speed:g}x" if speed >= 1 else f"1/{1 / speed:g}x"
+    if scheduler.rate < 0:
+        speed_text += " reverse"
+    if scheduler.paused:
+        speed_text += ", paused"
+    return f"Playback: {speed_text}"
+
 def position_to_text(num: int) -> str:
     """
     Convert a given position to its text representation
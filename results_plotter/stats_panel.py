@@ -0,0 +1,92 @@
+import string
+
+import cv2
+import numpy as np
+
+def glyph_extent(font_settings: dict) -> "tuple[int, int]":
+    """
+    Measure how far the ink of any printable character reaches above and below the baseline, by
+    drawing them all, as getTextSize understates brackets and slashes by a couple of pixels
+    Returns the rows (above, below) the baseline, excluding the baseline row
+    """
+    (text_width, text_height), baseline = cv2.getTextSize(string.printable.strip(), font_settings["fontFace"],
+                                                          font_settings["fontScale"], font_settings["thickness"])
+    # twice the reported size on each side, so nothing drawn is clipped
+    origin_y = 2 * text_height
+    scratch = np.zeros((origin_y + 2 * (baseline + text_height), text_width + 2 * text_height), dtype=np.uint8)
+    cv2.putText(scratch, string.printable.strip(), (text_height, origin_y), font_settings["fontFace"],
+                font_settings["fontScale"], 255, font_settings["thickness"], font_settings["lineType"])
+    ink_rows = np.flatnonzero(scratch.any(axis=1))
+    return int(origin_y - ink_rows[0]), int(ink_rows[-1] - origin_y)
+
+class StatsPanel:
+    """
+    A reusable uint8 canvas of lines of text, each a fixed label followed by a value
+
+    Labels are drawn once onto a static layer. Setting a line's value only redraws the area of that
+    line after its label, and only if the value has changed since the last frame, so drawing a
+    frame of stats allocates almost nothing
+    """
+    def __init__(self, width: int = 800, height: int = 800, font_settings: "dict | None" = None):
+        self.width = width
+        self.height = height
+        self.font_settings = font_settings or {
+            "fontFace": cv2.FONT_HERSHEY_SIMPLEX,
+            "fontScale": 1,
+            "color": (255, 0, 0),
+            "thickness": 2,
+            "lineType": 2
+        }
+        self.static_layer = np.full((height, width, 3), 255, dtype=np.uint8)
+        self.canvas = self.static_layer.copy()
+        # (label origin, value x, top row, bottom row) of each line, and the value last drawn on it
+        self.line_areas = []
+        self.line_values = []
+
+    def copy(self) -> "StatsPanel":
+        """
+        Return a panel with the same lines and its own canvas, sharing the static layer
+        """
+        clone = StatsPanel.__new__(StatsPanel)
+        clone.width = self.width
+        clone.height = self.height
+        clone.font_settings = self.font_settings
+        clone.static_layer = self.static_layer
+        clone.canvas = self.canvas.copy()
+        clone.line_areas = self.line_areas
+        clone.line_values = list(self.line_values)
+        return clone
+
+    def add_line(self, label: str, origin: "tuple[int, int]") -> int:
+        """
+        Add a line with a label drawn at origin, the bottom left of the text
+        Returns the index of the line used to set its value
+        """
+        thickness = self.font_settings["thickness"]
+        # rows reached by any glyph, with a pixel to spare, so clearing them removes every value drawn
+        above, below = glyph_extent(self.font_settings)
+        top = max(origin[1] - above - 1, 0)
+        bottom = min(origin[1] + below + 2, self.height)
+
+        value_x = origin[0]
+        if label:
+            cv2.putText(self.static_layer, label, origin, **self.font_settings)
+            # getTextSize pads the width by the thickness, the value starts where the label's glyphs end
+            value_x += cv2.getTextSize(label, self.font_settings["fontFace"], self.font_settings["fontScale"],
+                                       thickness)[0][0] - thickness
+        self.canvas[top:bottom] = self.static_layer[top:bottom]
+
+        self.line_areas.append((origin, value_x, top, bottom))
+        self.line_values.append(None)
+        return len(self.line_areas) - 1
+
+    def set_value(self, line: int, value: str) -> None:
+        """
+        Draw value after the label of a line, if it differs from the value already drawn
+        """
+        if value == self.line_values[line]:
+            return
+        origin, value_x, top, bottom = self.line_areas[line]
+        self.canvas[top:bottom, value_x:] = self.static_layer[top:bottom, value_x:]
+        cv2.putText(self.canvas, value, (value_x, origin[1]), **self.font_settings)
+        self.line_values[line] = value
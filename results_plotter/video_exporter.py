@@ -0,0 +1,211 @@
+from multiprocessing import Pool
+from pathlib import Path
+import sys
+
+import cv2
+import numpy as np
+import pandas as pd
+import yaml
+
+from results_plotter import map_view
+from results_plotter import results_plotter
+from results_reader import results_reader
+from utils import PixelCoordinate
+import utils
+
+# replay plotter owned by each worker process, created once by _init_worker
+_worker_plotter = None
+
+class VideoExporter:
+    """
+    Render the results replay without a display and write it to an mp4 or a png sequence
+
+    Frames are rendered out of order across a process pool and written back in order. Export
+    settings are read from the config, all optional:
+    - export_path: mp4 file, or directory for a png sequence
+    - export_format: "mp4" or "png"
+    - export_width, export_height: resolution of the output frames in pixels
+    - export_fps: frames per second of the output
+    - export_duration: length of the output in seconds
+    - export_workers: number of render processes, 1 renders in this process
+    """
+    def __init__(self, config: dict,
+                 results: "dict[str, pd.Dataframe]",
+                 control_coordinates: "dict[str, PixelCoordinate]",
+                 leg_statistics: pd.DataFrame):
+        self.config = config
+        self.results = results
+        self.control_coordinates = control_coordinates
+        self.leg_statistics = leg_statistics
+
+        self.export_path = export_path(self.config)
+        self.export_format = self.config.get("export_format", "mp4")
+        self.width = int(self.config.get("export_width", 1920))
+        self.height = int(self.config.get("export_height", 1080))
+        self.fps = float(self.config.get("export_fps", 30))
+        self.duration = float(self.config.get("export_duration", 30))
+        self.workers = int(self.config.get("export_workers", 4))
+        self.chunksize = 4
+        self.video_writer = None
+
+    def export(self, plotter: "results_plotter.ResultsPlotter | None" = None) -> Path:
+        """
+        Render every frame of the replay and write them to export_path
+        Returns the path written to
+
+        args:
+        - plotter: existing ResultsPlotter to render every frame with in this process, instead of
+          creating new ones
+        """
+        n_frames = int(self.duration * self.fps)
+        frame_args = [(frame_num / self.fps, self.duration, self.width, self.height) for frame_num in range(n_frames)]
+        init_args = (self.config, self.results, self.control_coordinates, self.leg_statistics, self.width, self.height)
+
+        self._open_destination()
+        if plotter is not None:
+            _use_plotter(plotter, self.width, self.height)
+            for frame_num, args in enumerate(frame_args):
+                self._write_frame(frame_num, _render_worker_frame(args))
+        elif self.workers > 1:
+            with Pool(self.workers, initializer=_init_worker, initargs=init_args) as pool:
+                # imap hands frames out to workers in chunks but yields them back in frame order
+                for frame_num, frame in enumerate(pool.imap(_render_worker_frame, frame_args, self.chunksize)):
+                    self._write_frame(frame_num, frame)
+        else:
+            _init_worker(*init_args)
+            for frame_num, args in enumerate(frame_args):
+                self._write_frame(frame_num, _render_worker_frame(args))
+        self._close_destination()
+
+        return self.export_path
+
+    def _open_destination(self) -> None:
+        """
+        Create the png directory or open the video writer
+        """
+        if self.export_format == "png":
+            self.export_path.mkdir(parents=True, exist_ok=True)
+            return
+
+        self.export_path.parent.mkdir(parents=True, exist_ok=True)
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        self.video_writer = cv2.VideoWriter(str(self.export_path), fourcc, self.fps, (self.width, self.height))
+        if not self.video_writer.isOpened():
+            raise RuntimeError(f"Unable to open {self.export_path} for writing")
+
+    def _write_frame(self, frame_num: int, frame: np.ndarray) -> None:
+        """
+        Write a single composed frame to the export destination
+        """
+        if self.export_format == "png":
+            cv2.imwrite(str(self.export_path / f"frame_{frame_num:06d}.png"), frame)
+        else:
+            self.video_writer.write(frame)
+
+    def _close_destination(self) -> None:
+        """
+        Finalise the video file
+        """
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+
+def export_path(config: dict) -> Path:
+    """
+    Return the path the replay of an event is exported to, by default results_directory/replay.mp4
+    """
+    default_path = Path(config["results_directory"]) / "replay.mp4"
+    return Path(config.get("export_path", default_path))
+
+def compose_frame(canvas_map: np.ndarray, stats_background: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Place the map and the stats panel side by side on a single width x height uint8 frame,
+    each scaled to fit its area while keeping its aspect ratio
+
+    args:
+    - canvas_map: numpy array of the map with teams drawn on
+    - stats_background: numpy array of the stats panel
+    - width: int representing the width of the output frame in pixels
+    - height: int representing the height of the output frame in pixels
+    """
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    stats_panel = to_uint8(stats_background)
+
+    stats_width = stats_area_width(width, height)
+    _paste_fitted(frame, stats_panel, width - stats_width, 0, stats_width, height)
+    _paste_fitted(frame, canvas_map, 0, 0, width - stats_width, height)
+    return frame
+
+def stats_area_width(width: int, height: int) -> int:
+    """
+    Return the width of the area on the right of a composed frame given to the stats panel,
+    the map gets the rest
+    """
+    return min(width // 3, height)
+
+def to_uint8(image: np.ndarray) -> np.ndarray:
+    """
+    Convert an image to uint8, treating float images as imshow does with 1.0 as full intensity
+    """
+    if image.dtype == np.uint8:
+        return image
+    return np.clip(image * 255, 0, 255).astype(np.uint8)
+
+def _paste_fitted(frame: np.ndarray, image: np.ndarray, x: int, y: int, area_width: int, area_height: int) -> None:
+    """
+    Resize image to fit inside the given area of frame, centred, and copy it in
+    """
+    image_height, image_width = image.shape[:2]
+    ratio = min(area_width / image_width, area_height / image_height)
+    fitted_width, fitted_height = max(1, int(image_width * ratio)), max(1, int(image_height * ratio))
+    fitted = cv2.resize(image, (fitted_width, fitted_height), interpolation=cv2.INTER_AREA)
+
+    x0 = x + (area_width - fitted_width) // 2
+    y0 = y + (area_height - fitted_height) // 2
+    frame[y0:y0 + fitted_height, x0:x0 + fitted_width] = fitted
+
+def _init_worker(config: dict,
+                 results: "dict[str, pd.Dataframe]",
+                 control_coordinates: "dict[str, PixelCoordinate]",
+                 leg_statistics: pd.DataFrame,
+                 width: int,
+                 height: int) -> None:
+    """
+    Create the replay plotter used by this process to render frames
+    """
+    _use_plotter(results_plotter.ResultsPlotter(config, results, control_coordinates, leg_statistics), width, height)
+
+def _use_plotter(plotter: results_plotter.ResultsPlotter, width: int, height: int) -> None:
+    """
+    Render frames in this process with plotter, with its map view sized to the map's area of the
+    width x height output frames
+    """
+    global _worker_plotter
+    _worker_plotter = plotter
+
+    viewport = plotter.viewport
+    viewport.set_output_size(*map_view.fit_size(viewport.map_width, viewport.map_height,
+                                                width - stats_area_width(width, height), height))
+
+def _render_worker_frame(args: "tuple[float, float, int, int]") -> np.ndarray:
+    """
+    Render a single composed frame at the given replay time
+    """
+    sim_time, sim_length, width, height = args
+    t_event = sim_time / _worker_plotter.event_time_scale(sim_length)
+    canvas_map, stats_background = _worker_plotter.render_frame(t_event)
+    return compose_frame(canvas_map, stats_background, width, height)
+
+def export_event(config: dict) -> Path:
+    """
+    Load the csv results of an event described by config and export its replay
+    """
+    control_coords = utils.get_control_coordinates(config)
+    results_rdr = results_reader.ResultsReader(config, control_coords)
+    results = results_rdr.parse_csv_results_directory()
+    leg_stats = results_rdr.parse_leg_statistics_csv()
+    return VideoExporter(config, results, control_coords, leg_stats).export()
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "r") as config_fp:
+        export_event(yaml.safe_load(config_fp))
@@ -0,0 +1,309 @@
+import hashlib
+import json
+from pathlib import Path
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from utils import PixelCoordinate
+
+BUNDLE_MAGIC = b"RGBUNDL1"
+ARRAY_ALIGNMENT = 64
+_RESULT_COLUMNS = ["control", "cumulative_points", "time_split", "distance", "cumulative_time", "cumulative_distance"]
+
+class EventBundle:
+    """
+    Store everything needed to replay an event in a single binary file that can be memory mapped:
+    the config, control coordinates, all team results as typed columns with per team offsets, and
+    the leg and control statistics
+
+    The bundle records a content hash of the files it was built from, so it can be rebuilt when
+    any of them change
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def for_config(cls, config: dict) -> "EventBundle":
+        """
+        Return the bundle for the event described by config, by default stored in the results directory
+        """
+        default_path = Path(config["results_directory"]) / "event-bundle.bin"
+        return cls(config.get("event_bundle", default_path))
+
+    def is_current(self, config: dict) -> bool:
+        """
+        Return whether the bundle exists and was built from the current source files
+        """
+        if not self.path.exists():
+            return False
+
+        header = read_array_header(self.path)
+        return sources_unchanged(header, config, lambda fingerprint: refresh_source_fingerprint(self.path, fingerprint))
+
+    def write(self, config: dict,
+              control_coordinates: "dict[str, PixelCoordinate]",
+              results: "dict[str, pd.Dataframe]",
+              leg_statistics: pd.DataFrame,
+              control_statistics: pd.DataFrame) -> None:
+        """
+        Write the event to the bundle file
+        """
+        controls = list(control_coordinates.keys())
+        header = {
+            "config": config,
+            "source_fingerprint": source_fingerprint(config),
+            "source_hash": source_hash(config),
+            "controls": controls,
+            "control_coordinates": [[control_coordinates[control].x, control_coordinates[control].y] for control in controls],
+            "team_numbers": list(results.keys()),
+            "leg_statistics": leg_statistics.to_dict("list"),
+            "control_statistics": control_statistics.to_dict("list"),
+        }
+        write_array_file(self.path, header, pack_results(results, controls))
+
+    def load(self) -> "tuple[dict, dict[str, PixelCoordinate], dict[str, pd.Dataframe], pd.DataFrame, pd.DataFrame]":
+        """
+        Load the event from the bundle file
+        Returns the config, control coordinates, results, leg statistics and control statistics
+        """
+        config, control_coordinates, leg_statistics, control_statistics = self.load_details()
+        return config, control_coordinates, self.load_results(), leg_statistics, control_statistics
+
+    def load_details(self) -> "tuple[dict, dict[str, PixelCoordinate], pd.DataFrame, pd.DataFrame]":
+        """
+        Load everything but the results from the bundle file, which only reads its header
+        Returns the config, control coordinates, leg statistics and control statistics
+        """
+        header = read_array_header(self.path)
+        control_coordinates = {control: PixelCoordinate(x, y)
+                               for control, (x, y) in zip(header["controls"], header["control_coordinates"])}
+        leg_statistics = pd.DataFrame(header["leg_statistics"])
+        control_statistics = pd.DataFrame(header["control_statistics"])
+        return header["config"], control_coordinates, leg_statistics, control_statistics
+
+    def load_results(self) -> "dict[str, pd.Dataframe]":
+        """
+        Load every team's result from the bundle file
+        """
+        header, arrays = read_array_file(self.path)
+        return unpack_results(arrays, header["controls"], header["team_numbers"])
+
+def pack_results(results: "dict[str, pd.Dataframe]", controls: "list[str]") -> "dict[str, np.ndarray]":
+    """
+    Pack every team's result into typed columns over all teams' rows, with controls stored as
+    their index in controls and each team's rows starting at team_offsets
+    """
+    control_codes = {control: code for code, control in enumerate(controls)}
+    team_lengths = [len(result) for result in results.values()]
+    team_offsets = np.zeros(len(team_lengths) + 1, dtype=np.int64)
+    np.cumsum(team_lengths, out=team_offsets[1:])
+
+    frames = list(results.values())
+    columns = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=_RESULT_COLUMNS)
+    return {
+        "team_offsets": team_offsets,
+        "control": np.array([control_codes[control] for control in columns.control], dtype=np.int32),
+        "cumulative_points": columns.cumulative_points.to_numpy(dtype=np.int64),
+        "time_split_ms": _to_milliseconds(columns.time_split),
+        "distance": columns.distance.to_numpy(dtype=np.float64),
+        "cumulative_time_ms": _to_milliseconds(columns.cumulative_time),
+        "cumulative_distance": columns.cumulative_distance.to_numpy(dtype=np.float64),
+    }
+
+def unpack_results(arrays: "dict[str, np.ndarray]", controls: "list[str]",
+                   team_numbers: "list[str]") -> "dict[str, pd.Dataframe]":
+    """
+    Rebuild the team_number:result dictionary from columns packed by pack_results
+    """
+    # build one frame over every team's rows, each team's result is then a slice of it
+    all_results = pd.DataFrame({
+        "control": np.array(controls, dtype=object)[arrays["control"]],
+        "cumulative_points": arrays["cumulative_points"],
+        "time_split": pd.to_timedelta(arrays["time_split_ms"], unit="ms"),
+        "distance": arrays["distance"],
+        "cumulative_time": pd.to_timedelta(arrays["cumulative_time_ms"], unit="ms"),
+        "cumulative_distance": arrays["cumulative_distance"],
+    }, columns=_RESULT_COLUMNS)
+    team_offsets = arrays["team_offsets"].tolist()
+
+    results = {}
+    for team_idx, team_number in enumerate(team_numbers):
+        team_rows = all_results.iloc[team_offsets[team_idx]:team_offsets[team_idx + 1]]
+        results[team_number] = team_rows.reset_index(drop=True)
+    return results
+
+def source_files(config: dict) -> "list[Path]":
+    """
+    Return the files an event bundle is built from, in a stable order
+    """
+    results_files = sorted(Path(config["results_directory"]).glob("*_result.csv"))
+    other_files = [Path(config[key]) for key in ["control_coordinates", "leg_statistics", "control_statistics"]]
+    return results_files + [filepath for filepath in other_files if filepath.exists()]
+
+def source_fingerprint(config: dict) -> "list[list]":
+    """
+    Return the name, size and modification time of each source file, cheap to compare without reading them
+    """
+    return files_fingerprint(source_files(config))
+
+def source_hash(config: dict) -> str:
+    """
+    Return a sha256 hash of the names and contents of the source files
+    """
+    return files_hash(source_files(config))
+
+def sources_unchanged(recorded: dict, config: dict, refresh) -> bool:
+    """
+    Return whether the source files of config are the ones recorded in recorded["source_fingerprint"]
+    and recorded["source_hash"], as for files_unchanged
+    """
+    return files_unchanged(recorded, source_files(config), refresh)
+
+def files_fingerprint(filepaths: "list[Path]") -> "list[list]":
+    """
+    Return the name, size and modification time of each file
+    """
+    fingerprint = []
+    for filepath in filepaths:
+        stat = filepath.stat()
+        fingerprint.append([str(filepath), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+def files_hash(filepaths: "list[Path]") -> str:
+    """
+    Return a sha256 hash of the names and contents of the files
+    """
+    digest = hashlib.sha256()
+    for filepath in filepaths:
+        digest.update(str(filepath).encode())
+        digest.update(filepath.read_bytes())
+    return digest.hexdigest()
+
+def files_unchanged(recorded: dict, filepaths: "list[Path]", refresh) -> bool:
+    """
+    Return whether the files are the ones recorded in recorded["source_fingerprint"] and
+    recorded["source_hash"]
+
+    Sizes and modification times are compared first, the files are only read and hashed when
+    they differ. If the contents still match, the files were only touched or copied, so refresh is
+    called with the current fingerprint to record it and the next check doesn't read them again
+    """
+    fingerprint = files_fingerprint(filepaths)
+    # size and modification time match, no need to read the files
+    if recorded["source_fingerprint"] == fingerprint:
+        return True
+    if recorded["source_hash"] != files_hash(filepaths):
+        return False
+    refresh(fingerprint)
+    return True
+
+def refresh_source_fingerprint(path: Path, fingerprint: "list[list]") -> None:
+    """
+    Rewrite a file written by write_array_file with the given source fingerprint in its header
+    """
+    path = Path(path)
+    with open(path, "rb") as bundle_fp:
+        header, data_start = _read_header(bundle_fp, path)
+        header["source_fingerprint"] = fingerprint
+        header_bytes = json.dumps(header, default=_json_default).encode()
+
+        # the arrays are copied across unchanged without mapping them, the header only moves the
+        # data section to the next aligned offset, which array offsets are relative to
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "wb") as refreshed_fp:
+            refreshed_fp.write(BUNDLE_MAGIC)
+            refreshed_fp.write(len(header_bytes).to_bytes(8, "little"))
+            refreshed_fp.write(header_bytes)
+            refreshed_fp.seek(_align(len(BUNDLE_MAGIC) + 8 + len(header_bytes)))
+            bundle_fp.seek(data_start)
+            shutil.copyfileobj(bundle_fp, refreshed_fp)
+    temp_path.replace(path)
+
+def write_array_file(path: Path, header: dict, arrays: "dict[str, np.ndarray]") -> None:
+    """
+    Write a json header and a set of numpy arrays to a single file, each array aligned so it can
+    be memory mapped in place
+
+    Layout: magic bytes, little endian uint64 header length, json header, then the raw arrays from
+    the next aligned offset, with each array's offset in the header relative to that data section
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header = dict(header)
+    header["arrays"] = {}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps(header, default=_json_default).encode()
+    data_start = _align(len(BUNDLE_MAGIC) + 8 + len(header_bytes))
+
+    # write to a temporary file first so a reader never sees a partly written bundle
+    path = Path(path)
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "wb") as bundle_fp:
+        bundle_fp.write(BUNDLE_MAGIC)
+        bundle_fp.write(len(header_bytes).to_bytes(8, "little"))
+        bundle_fp.write(header_bytes)
+        for name, array in arrays.items():
+            bundle_fp.seek(data_start + header["arrays"][name]["offset"])
+            bundle_fp.write(array.tobytes())
+    temp_path.replace(path)
+
+def read_array_file(path: Path) -> "tuple[dict, dict[str, np.ndarray]]":
+    """
+    Read a file written by write_array_file, returning its header and its arrays memory mapped read only
+    """
+    with open(path, "rb") as bundle_fp:
+        header, data_start = _read_header(bundle_fp, path)
+
+    arrays = {}
+    for name, array_info in header["arrays"].items():
+        shape = tuple(array_info["shape"])
+        if np.prod(shape) == 0:
+            arrays[name] = np.empty(shape, dtype=array_info["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=array_info["dtype"], mode="r",
+                                     offset=data_start + array_info["offset"], shape=shape)
+    return header, arrays
+
+def read_array_header(path: Path) -> dict:
+    """
+    Read only the header of a file written by write_array_file, without mapping any of its arrays
+    """
+    with open(path, "rb") as bundle_fp:
+        header, _data_start = _read_header(bundle_fp, path)
+    return header
+
+def _read_header(bundle_fp, path: Path) -> "tuple[dict, int]":
+    """
+    Read the header from the start of an open file written by write_array_file
+    Returns the header and the offset of the data section
+    """
+    if bundle_fp.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+        raise ValueError(f"{path} is not an event bundle")
+    header_length = int.from_bytes(bundle_fp.read(8), "little")
+    header = json.loads(bundle_fp.read(header_length))
+    return header, _align(len(BUNDLE_MAGIC) + 8 + header_length)
+
+def _align(offset: int) -> int:
+    """
+    Round offset up to the next multiple of ARRAY_ALIGNMENT
+    """
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+def _json_default(value):
+    """
+    Convert numpy scalars in the header to plain python values
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _to_milliseconds(column: pd.Series) -> np.ndarray:
+    """
+    Convert a timedelta column to int64 milliseconds
+    """
+    return column.to_numpy().astype("timedelta64[ms]").astype(np.int64)
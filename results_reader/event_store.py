@@ -0,0 +1,228 @@
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from results_reader import event_bundle
+from results_reader import results_reader
+from utils import PixelCoordinate
+import utils
+
+class EventStore:
+    """
+    Every team's result in one set of contiguous typed columns, with each team's rows between
+    team_offsets[team_idx] and team_offsets[team_idx + 1]
+
+    Controls are interned as small integer ids into controls, whose pixel positions are rows of
+    coordinates, and times are whole milliseconds. Compared to a DataFrame per team there is no
+    per team overhead and no python strings or timedelta objects, so large fields take a fraction
+    of the memory. team() gives a thin per team view for code still written against a single
+    team's result, and to_results() rebuilds the dictionary of DataFrames when one is needed
+    """
+    def __init__(self, team_numbers: "list[str]",
+                 team_offsets: np.ndarray,
+                 columns: "dict[str, np.ndarray]",
+                 controls: "list[str]",
+                 coordinates: np.ndarray):
+        self.team_numbers = list(team_numbers)
+        self.team_index = {team: idx for idx, team in enumerate(self.team_numbers)}
+        self.team_offsets = np.asarray(team_offsets, dtype=np.int64)
+        self.controls = list(controls)
+        self.control_ids = {control: control_id for control_id, control in enumerate(self.controls)}
+        self.control_names = np.array(self.controls, dtype=object)
+        self.coordinates = np.asarray(coordinates, dtype=np.int32).reshape(-1, 2)
+
+        control_dtype = np.int16 if len(self.controls) <= np.iinfo(np.int16).max else np.int32
+        self.control_id = np.asarray(columns["control"], dtype=control_dtype)
+        self.cumulative_points = np.asarray(columns["cumulative_points"], dtype=np.int32)
+        self.time_split_ms = np.asarray(columns["time_split_ms"], dtype=np.int32)
+        self.cumulative_time_ms = np.asarray(columns["cumulative_time_ms"], dtype=np.int32)
+        self.distance = np.asarray(columns["distance"], dtype=np.float64)
+        self.cumulative_distance = np.asarray(columns["cumulative_distance"], dtype=np.float64)
+
+    @classmethod
+    def from_results(cls, results: "dict[str, pd.Dataframe]",
+                     control_coordinates: "dict[str, PixelCoordinate]") -> "EventStore":
+        """
+        Pack the team_number:result dictionary returned by ResultsReader
+        """
+        controls = list(control_coordinates.keys())
+        coordinates = [[control_coordinates[control].x, control_coordinates[control].y] for control in controls]
+        return cls.from_arrays(event_bundle.pack_results(results, controls), controls, list(results.keys()), coordinates)
+
+    @classmethod
+    def from_arrays(cls, arrays: "dict[str, np.ndarray]",
+                    controls: "list[str]",
+                    team_numbers: "list[str]",
+                    coordinates: "list[list[int]] | np.ndarray") -> "EventStore":
+        """
+        Wrap columns packed by event_bundle.pack_results, such as those of an event bundle
+        """
+        return cls(team_numbers, arrays["team_offsets"], arrays, controls, coordinates)
+
+    @classmethod
+    def from_bundle(cls, bundle: event_bundle.EventBundle) -> "EventStore":
+        """
+        Load the results of an event bundle without building a DataFrame per team
+        """
+        header, arrays = event_bundle.read_array_file(bundle.path)
+        return cls.from_arrays(arrays, header["controls"], header["team_numbers"], header["control_coordinates"])
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes held by the store's arrays
+        """
+        return sum(array.nbytes for array in self.arrays().values()) + self.coordinates.nbytes
+
+    def arrays(self) -> "dict[str, np.ndarray]":
+        """
+        Return the columns in the layout of event_bundle.pack_results
+        """
+        return {
+            "team_offsets": self.team_offsets,
+            "control": self.control_id,
+            "cumulative_points": self.cumulative_points,
+            "time_split_ms": self.time_split_ms,
+            "distance": self.distance,
+            "cumulative_time_ms": self.cumulative_time_ms,
+            "cumulative_distance": self.cumulative_distance,
+        }
+
+    def team_rows(self, team_number: str) -> slice:
+        """
+        Return the rows of a team's result within the columns
+        """
+        team_idx = self.team_index[team_number]
+        return slice(int(self.team_offsets[team_idx]), int(self.team_offsets[team_idx + 1]))
+
+    def team(self, team_number: str) -> "TeamView":
+        """
+        Return a view of a team's result, sharing the store's columns
+        """
+        return TeamView(self, self.team_rows(team_number))
+
+    def to_results(self) -> "dict[str, pd.Dataframe]":
+        """
+        Return every team's result as a DataFrame, as returned by ResultsReader
+        """
+        return event_bundle.unpack_results(self.arrays(), self.controls, self.team_numbers)
+
+    def control_coordinates(self) -> "dict[str, PixelCoordinate]":
+        """
+        Return the position of each control, as returned by utils.get_control_coordinates
+        """
+        return {control: PixelCoordinate(x, y) for control, (x, y) in zip(self.controls, self.coordinates.tolist())}
+
+class TeamView:
+    """
+    A single team's rows of an EventStore, each column a view of the store's column
+    """
+    def __init__(self, store: EventStore, rows: slice):
+        self.store = store
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return self.rows.stop - self.rows.start
+
+    @property
+    def control_id(self) -> np.ndarray:
+        return self.store.control_id[self.rows]
+
+    @property
+    def control(self) -> np.ndarray:
+        return self.store.control_names[self.control_id]
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        return self.store.coordinates[self.control_id]
+
+    @property
+    def cumulative_points(self) -> np.ndarray:
+        return self.store.cumulative_points[self.rows]
+
+    @property
+    def time_split_ms(self) -> np.ndarray:
+        return self.store.time_split_ms[self.rows]
+
+    @property
+    def cumulative_time_ms(self) -> np.ndarray:
+        return self.store.cumulative_time_ms[self.rows]
+
+    @property
+    def distance(self) -> np.ndarray:
+        return self.store.distance[self.rows]
+
+    @property
+    def cumulative_distance(self) -> np.ndarray:
+        return self.store.cumulative_distance[self.rows]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Return the team's result as a DataFrame, as returned by ResultsReader
+        """
+        return pd.DataFrame({
+            "control": self.control,
+            "cumulative_points": self.cumulative_points.astype(np.int64),
+            "time_split": pd.to_timedelta(self.time_split_ms, unit="ms"),
+            "distance": self.distance,
+            "cumulative_time": pd.to_timedelta(self.cumulative_time_ms, unit="ms"),
+            "cumulative_distance": self.cumulative_distance,
+        })
+
+def memory_report(store: EventStore) -> "dict[str, int]":
+    """
+    Return the bytes used by the store next to the bytes used by the same event as a dictionary
+    of DataFrames and a dictionary of PixelCoordinates
+    - store_bytes: the store's arrays
+    - results_bytes: allocated building the DataFrames, including pandas' own overhead
+    - results_pandas_bytes: the DataFrames' own count of their memory, with strings counted deeply
+    - control_coordinates_bytes: allocated building the PixelCoordinates
+    """
+    results, results_bytes = _traced_allocation(store.to_results)
+    control_coordinates, control_coordinates_bytes = _traced_allocation(store.control_coordinates)
+    return {
+        "teams": len(store.team_numbers),
+        "rows": len(store.control_id),
+        "store_bytes": store.nbytes,
+        "results_bytes": results_bytes,
+        "results_pandas_bytes": int(sum(result.memory_usage(index=True, deep=True).sum() for result in results.values())),
+        "control_coordinates_bytes": control_coordinates_bytes,
+    }
+
+def memory_report_text(report: "dict[str, int]") -> str:
+    """
+    Return a memory report from memory_report as lines of text
+    """
+    current_bytes = report["results_bytes"] + report["control_coordinates_bytes"]
+    return "\n".join([
+        f"{report['teams']} teams, {report['rows']} result rows",
+        f"dict of DataFrames:   {report['results_bytes'] / 2**20:8.2f} MiB "
+        f"({report['results_pandas_bytes'] / 2**20:.2f} MiB by DataFrame.memory_usage)",
+        f"control coordinates:  {report['control_coordinates_bytes'] / 2**10:8.2f} KiB",
+        f"event store:          {report['store_bytes'] / 2**20:8.2f} MiB "
+        f"({current_bytes / max(report['store_bytes'], 1):.1f}x smaller)",
+    ])
+
+def _traced_allocation(func) -> "tuple[object, int]":
+    """
+    Call func, returning its value and the bytes it allocated that are still held by the value
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = func()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    if not was_tracing:
+        tracemalloc.stop()
+    return value, allocated
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "r") as config_fp:
+        event_config = yaml.safe_load(config_fp)
+    event_control_coords = utils.get_control_coordinates(event_config)
+    event_results = results_reader.ResultsReader(event_config, event_control_coords).parse_csv_results_directory()
+    print(memory_report_text(memory_report(EventStore.from_results(event_results, event_control_coords))))
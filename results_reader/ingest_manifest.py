@@ -0,0 +1,102 @@
+import hashlib
+from pathlib import Path
+
+import pandas as pd
+
+from results_reader import event_bundle
+
+class IngestManifest:
+    """
+    Record of the txt result files last parsed from a results directory, and the results parsed
+    from them, so re-ingesting only parses files that are new or have changed
+
+    Each file is recorded with its size, modification time and a sha256 hash of its contents. A
+    file whose size and modification time match is unchanged without being read, otherwise its
+    hash decides. Distances depend on the control coordinates and map scale, so the manifest is
+    discarded whenever either changes
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def for_config(cls, config: dict) -> "IngestManifest":
+        """
+        Return the manifest of the results directory in config, by default stored in the results directory
+        """
+        default_path = Path(config["results_directory"]) / "ingest-manifest.bin"
+        return cls(config.get("ingest_manifest", default_path))
+
+    def load(self, config: dict) -> "tuple[dict[str, dict], dict[str, pd.Dataframe]]":
+        """
+        Return the recorded file of each team as team_number:file entry, and the results parsed
+        from them, both empty if there is no usable manifest
+        """
+        if not self.path.exists():
+            return {}, {}
+
+        header, arrays = event_bundle.read_array_file(self.path)
+        if header.get("inputs") != ingest_inputs(config):
+            return {}, {}
+        results = event_bundle.unpack_results(arrays, header["controls"], header["team_numbers"])
+        return header["files"], results
+
+    def write(self, config: dict,
+              files: "dict[str, dict]",
+              results: "dict[str, pd.Dataframe]") -> None:
+        """
+        Record the file of each team and the results parsed from them
+        """
+        controls = sorted({"HH"}.union(*(set(result.control) for result in results.values())))
+        header = {
+            "inputs": ingest_inputs(config),
+            "files": files,
+            "controls": controls,
+            "team_numbers": list(results.keys()),
+        }
+        event_bundle.write_array_file(self.path, header, event_bundle.pack_results(results, controls))
+
+def file_entry(filepath: Path, sha256: "str | None" = None) -> dict:
+    """
+    Return the name, size, modification time and content hash of a file
+    """
+    stat = filepath.stat()
+    return {
+        "name": filepath.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256 or file_hash(filepath),
+    }
+
+def file_hash(filepath: Path) -> str:
+    """
+    Return a sha256 hash of a file's contents
+    """
+    return hashlib.sha256(filepath.read_bytes()).hexdigest()
+
+def unchanged_entry(entry: "dict | None", filepath: Path) -> "dict | None":
+    """
+    Return the up to date entry of a file if its contents match the recorded entry, None if it is new or changed
+    """
+    if entry is None or entry["name"] != filepath.name:
+        return None
+    stat = filepath.stat()
+    if stat.st_size != entry["size"]:
+        return None
+    if stat.st_mtime_ns == entry["mtime_ns"]:
+        return entry
+
+    # touched but maybe not edited, compare contents
+    sha256 = file_hash(filepath)
+    if sha256 != entry["sha256"]:
+        return None
+    return file_entry(filepath, sha256)
+
+def ingest_inputs(config: dict) -> dict:
+    """
+    Return what every parsed result depends on besides its own file
+    """
+    control_coordinates = Path(config["control_coordinates"])
+    return {
+        "control_coordinates": file_hash(control_coordinates) if control_coordinates.exists() else None,
+        "map_scale_pixels": config.get("map_scale_pixels"),
+    }
@@ -1,8 +1,10 @@
-import math
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+from results_reader import ingest_manifest
 from utils import PixelCoordinate
 
 class ResultsReader:
@@ -12,6 +14,9 @@ class ResultsReader:
     def __init__(self, config: dict, control_coordinates: "dict[str, PixelCoordinate]"):
         self.config = config
         self.control_coordinates = control_coordinates
+        # controls interned to row/column indices of distance_matrix
+        self.control_index = {control: idx for idx, control in enumerate(control_coordinates)}
+        self._distance_matrix = None
         self.fields = ["control",
                        "cumulative_points",
                        "time_split",
@@ -20,72 +25,200 @@ class ResultsReader:
                        "cumulative_distance"
                        ]
 
-    def parse_txt_results_directory(self) -> "dict[str, pd.Dataframe]":
+    def parse_txt_results_directory(self, workers: "int | None" = None, chunksize: "int | None" = None) -> "dict[str, pd.Dataframe]":
         """
         Parse the original txt files of results into a dictionary of team_number:team_result
+
+        args:
+        - workers: number of processes to parse the team files across, 1 parses them in this process,
+          defaults to config["ingest_workers"] or 1
+        - chunksize: number of team files handed to a worker process at a time, defaults to
+          config["ingest_chunksize"] or 16
         """
-        results = {}
+        return self._parse_team_txt_results(self._team_txt_filepaths(), workers, chunksize)
+
+    def update_txt_results_directory(self, workers: "int | None" = None,
+                                     chunksize: "int | None" = None,
+                                     reparse: bool = False) -> "tuple[dict[str, pd.Dataframe], list[str], list[str]]":
+        """
+        Bring the csv results up to date with the txt files, parsing only files that are new or
+        changed since the last update and deleting the csv files of teams whose txt file was removed.
+        Statistics derived from the results are recalculated in place, see update_derived_statistics
+        Returns the results of every team as team_number:team_result, the changed teams and the removed teams
+
+        args:
+        - workers, chunksize: as for parse_txt_results_directory, used for the changed files
+        - reparse: parse every file, whether or not it changed
+        """
+        manifest = ingest_manifest.IngestManifest.for_config(self.config)
+        recorded_files, recorded_results = manifest.load(self.config)
+        results_dir = Path(self.config["results_directory"])
+
+        team_filepaths = self._team_txt_filepaths()
+        files = {}
+        changed_filepaths = {}
+        for team_number, filepath in team_filepaths.items():
+            entry = None
+            if not reparse and team_number in recorded_results and (results_dir / f"{team_number}_result.csv").exists():
+                entry = ingest_manifest.unchanged_entry(recorded_files.get(team_number), filepath)
+            if entry is None:
+                changed_filepaths[team_number] = filepath
+                entry = ingest_manifest.file_entry(filepath)
+            files[team_number] = entry
+
+        # csv files left behind by a removed txt file, whether or not the manifest recorded it
+        csv_teams = [filepath.name.split("_")[0] for filepath in results_dir.glob("*_result.csv")]
+        removed_teams = [team_number for team_number in dict.fromkeys([*recorded_files, *csv_teams])
+                         if team_number not in team_filepaths]
+        for team_number in removed_teams:
+            (results_dir / f"{team_number}_result.csv").unlink(missing_ok=True)
+
+        changed_results = self._parse_team_txt_results(changed_filepaths, workers, chunksize)
+        self.write_csv_results(changed_results)
+
+        results = {team_number: changed_results.get(team_number, recorded_results.get(team_number))
+                   for team_number in team_filepaths}
+        manifest.write(self.config, files, results)
+        self.update_derived_statistics(results, bool(changed_filepaths or removed_teams))
+        return results, list(changed_filepaths), removed_teams
+
+    def update_derived_statistics(self, results: "dict[str, pd.Dataframe]", results_changed: bool = True) -> "list[Path]":
+        """
+        Recalculate the leg and control statistics csv files that are derived from the results, as
+        set by config["derive_leg_statistics"] and config["derive_control_statistics"], when the
+        results changed or the file doesn't exist yet. Statistics converted from navlight txt files
+        are left as they are
+        Returns the files written
+        """
+        written = []
+        for derive_key, stats_key, calculate in [("derive_leg_statistics", "leg_statistics", self.calculate_leg_statistics),
+                                                 ("derive_control_statistics", "control_statistics", self.calculate_control_statistics)]:
+            if not self.config.get(derive_key, False):
+                continue
+            stats_path = Path(self.config[stats_key])
+            if results_changed or not stats_path.exists():
+                stats_path.parent.mkdir(parents=True, exist_ok=True)
+                calculate(results).to_csv(stats_path, index=False)
+                written.append(stats_path)
+        return written
+
+    def _parse_team_txt_results(self, team_filepaths: "dict[str, Path]",
+                                workers: "int | None" = None, chunksize: "int | None" = None) -> "dict[str, pd.Dataframe]":
+        """
+        Parse the txt result file of each team, as team_number:filepath, across workers processes
+        """
+        if workers is None:
+            workers = int(self.config.get("ingest_workers", 1))
+        if chunksize is None:
+            chunksize = int(self.config.get("ingest_chunksize", 16))
+
+        if workers > 1 and len(team_filepaths) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                team_results = executor.map(self._parse_team_txt_result, team_filepaths.values(), chunksize=chunksize)
+                results = dict(zip(team_filepaths.keys(), team_results))
+        else:
+            results = {team_number: self._parse_team_txt_result(filepath)
+                       for team_number, filepath in team_filepaths.items()}
+
+        return results
 
+    def parse_txt_team_names(self) -> "dict[str, str]":
+        """
+        Return the team name from the first line of each team's txt result file, as team_number:team_name
+        """
+        team_names = {}
+        for team_number, filepath in self._team_txt_filepaths().items():
+            with open(filepath) as result_fp:
+                words = result_fp.readline().split()
+            # the first line is "Team <number>  <name>", only the name is kept, with single spaces
+            if len(words) >= 2 and words[0] == "Team":
+                words = words[2:]
+            team_names[team_number] = " ".join(words)
+        return team_names
+
+    def _team_txt_filepaths(self) -> "dict[str, Path]":
+        """
+        Return the txt result file of each team in the results directory, as team_number:filepath
+        """
+        # only the first file found for each team is parsed
+        team_filepaths = {}
         file_pattern = "*_*.txt"
         for filepath in Path(self.config["results_directory"]).glob(file_pattern):
             filename = filepath.name
             team_number = filename.split("_")[0]
-            if team_number not in results:
-                result = self._parse_txt_result(filepath)
+            if team_number not in team_filepaths:
+                team_filepaths[team_number] = filepath
+        return team_filepaths
 
-                # calculate cumulative time
-                result["cumulative_time"] = result.time_split.cumsum()
-                result["cumulative_time"] = pd.to_timedelta(result["cumulative_time"])
+    def _parse_team_txt_result(self, filepath: Path) -> pd.DataFrame:
+        """
+        Parse an individual txt result file and add the cumulative time and distance columns
+        """
+        result = self._parse_txt_result(filepath)
 
-                # calculate cumulative distance
-                result["cumulative_distance"] = result.distance.cumsum()
+        # calculate cumulative time
+        result["cumulative_time"] = result.time_split.cumsum()
+        result["cumulative_time"] = pd.to_timedelta(result["cumulative_time"])
 
-                results[team_number] = result
+        # calculate cumulative distance
+        result["cumulative_distance"] = result.distance.cumsum()
 
-        return results
+        return result
 
     def _parse_txt_result(self, filepath: Path) -> pd.DataFrame:
         """
         Parse an individual txt result file and return a pandas dataframe
         """
-        result = pd.DataFrame(columns=self.fields[:4])
-
-        for line_num, line in enumerate(open(filepath)):
-            # ignore first 3 lines, only descriptive info about file
-            if line_num < 3:
-                continue
-
-            # ignore line starting with No and Distance and newline:
-            if line.startswith("No") or line.startswith("Distance") or line == "\n":
-                continue
-
-            if line.lstrip().startswith("Late Penalty"):
-                original_points = result.loc[len(result) - 1, "cumulative_points"]
-                deduction = int(line.split()[-1])
-                final_total = original_points + deduction
-                control, cumulative_points, time_split = "HH", final_total, "00:00:00"
-
-            else:
-                # extract relevant fields
-                _no, control, _time, _dist, _cm_dist, cumulative_points, time_split, *_other_fields = line.lstrip().split()
-
-            # pad time with zero hours if necessary
-            if time_split.count(":") == 1:
-                time_split = "00:" + time_split
-
-            # calculate distance travelled
-            prev_control = ""
-            if len(result) == 0:
-                prev_control = "HH"
-            else:
-                prev_entry = result.loc[len(result) - 1]
-                prev_control = prev_entry["control"]
-
-            distance_travelled = self.calculate_distance_between_controls(prev_control, control)
-
-            entry = [control, int(float(cumulative_points)), pd.Timedelta(time_split), distance_travelled]
-            result.loc[len(result)] = entry
-
+        controls = []
+        cumulative_points = []
+        time_splits = []
+        control_idxs = []
+
+        with open(filepath) as result_fp:
+            for line_num, line in enumerate(result_fp):
+                # ignore first 3 lines, only descriptive info about file
+                if line_num < 3:
+                    continue
+
+                # ignore line starting with No and Distance and newline:
+                if line.startswith("No") or line.startswith("Distance") or line == "\n":
+                    continue
+
+                if line.lstrip().startswith("Late Penalty"):
+                    original_points = cumulative_points[-1]
+                    deduction = int(line.split()[-1])
+                    final_total = original_points + deduction
+                    control, points, time_split = "HH", final_total, "00:00:00"
+
+                else:
+                    # extract relevant fields
+                    _no, control, _time, _dist, _cm_dist, points, time_split, *_other_fields = line.lstrip().split()
+
+                # pad time with zero hours if necessary
+                if time_split.count(":") == 1:
+                    time_split = "00:" + time_split
+
+                controls.append(control)
+                control_idxs.append(self.control_index[control])
+                cumulative_points.append(int(float(points)))
+                time_splits.append(time_split)
+
+        # calculate distance travelled on every leg at once, the first leg starting from HH
+        curr_control_idxs = np.array(control_idxs, dtype=np.int64)
+        prev_control_idxs = np.empty_like(curr_control_idxs)
+        if len(curr_control_idxs):
+            prev_control_idxs[0] = self.control_index["HH"]
+            prev_control_idxs[1:] = curr_control_idxs[:-1]
+            distances = self.distance_matrix[prev_control_idxs, curr_control_idxs]
+        else:
+            distances = np.zeros(0, dtype=np.float64)
+
+        result = pd.DataFrame({
+            "control": controls,
+            "cumulative_points": pd.Series(cumulative_points, dtype="int64"),
+            "time_split": pd.to_timedelta(pd.Series(time_splits, dtype="object")),
+            "distance": distances,
+        }, columns=self.fields[:4])
         return result
 
     def parse_csv_results_directory(self) -> "dict[str, pd.Dataframe]":
@@ -122,36 +255,115 @@ class ResultsReader:
             filepath = Path(self.config["results_directory"]) / filename
             result.to_csv(filepath, index=False)
 
+    @property
+    def distance_matrix(self) -> np.ndarray:
+        """
+        N x N matrix of the distance in km between every pair of controls, indexed by control_index
+        Built on first use, as the map scale may not be known yet when the reader is created
+        """
+        if self._distance_matrix is None:
+            coords = np.array([[coordinate.x, coordinate.y] for coordinate in self.control_coordinates.values()],
+                              dtype=np.float64).reshape(-1, 2)
+            deltas = coords[:, np.newaxis, :] - coords[np.newaxis, :, :]
+            dist_pixels = np.sqrt((deltas**2).sum(axis=-1))
+
+            # convert to km
+            scale_str = self.config["map_scale_pixels"].split(":")
+            ratio = int(scale_str[0]) / int(scale_str[1])
+            self._distance_matrix = (dist_pixels / ratio) / 1000
+
+        return self._distance_matrix
+
     def calculate_distance_between_controls(self, prev_control: str, curr_control: str) -> float:
         """
         Calculate the distance in km between the previous control and the current control
         """
-        prev_control_coords = self.control_coordinates[prev_control]
-        curr_control_coords = self.control_coordinates[curr_control]
-        dx = prev_control_coords.x - curr_control_coords.x
-        dy = prev_control_coords.y - curr_control_coords.y
-        dist_pixels = math.sqrt(dx**2 + dy**2)
-
-        # convert to km
-        scale_str = self.config["map_scale_pixels"].split(":")
-        ratio = int(scale_str[0]) / int(scale_str[1])
-        dist_km = (dist_pixels / ratio) / 1000
+        return float(self.distance_matrix[self.control_index[prev_control], self.control_index[curr_control]])
 
-        return dist_km
+    def calculate_control_statistics(self, results: "dict[str, pd.Dataframe]") -> pd.DataFrame:
+        """
+        Count the visits to each control across every team's results and return a pandas dataframe
+        in the same format as parse_control_statistics_txt, HH is not counted as a visit
+        """
+        legs = self._concat_legs(results)
+        visited = legs[legs.curr != self.control_index["HH"]]
+        visit_counts = np.bincount(visited.curr.to_numpy(), minlength=len(self.control_index))
+
+        controls = np.array(list(self.control_index), dtype=object)
+        visited_controls = np.flatnonzero(visit_counts)
+        control_statistics = pd.DataFrame({
+            "control": controls[visited_controls],
+            "visit_count": visit_counts[visited_controls],
+        })
+        control_statistics = control_statistics.sort_values(["visit_count", "control"], ascending=[False, True])
+        return control_statistics.reset_index(drop=True)
+
+    def calculate_leg_statistics(self, results: "dict[str, pd.Dataframe]") -> pd.DataFrame:
+        """
+        Aggregate the legs run in every team's results and return a pandas dataframe in the same
+        format as parse_leg_statistics_txt, with the 10th percentile, median and 90th percentile
+        split times in seconds of each leg added
+        """
+        columns = ["leg", "leg_count", "median_split_secs", "p10_split_secs", "p90_split_secs"]
+        legs = self._concat_legs(results)
+        if legs.empty:
+            return pd.DataFrame(columns=columns)
+
+        split_secs = legs.groupby(["prev", "curr"]).split_secs
+        leg_statistics = split_secs.quantile([0.1, 0.5, 0.9]).unstack()
+        leg_statistics.columns = ["p10_split_secs", "median_split_secs", "p90_split_secs"]
+        leg_statistics["leg_count"] = split_secs.size()
+        leg_statistics = leg_statistics.reset_index()
+
+        controls = np.array(list(self.control_index), dtype=object)
+        leg_statistics.insert(0, "leg", controls[leg_statistics.prev.to_numpy()] + ":" + controls[leg_statistics.curr.to_numpy()])
+        leg_statistics = leg_statistics[columns]
+        leg_statistics = leg_statistics.sort_values(["leg_count", "leg"], ascending=[False, True])
+        return leg_statistics.reset_index(drop=True)
+
+    def _concat_legs(self, results: "dict[str, pd.Dataframe]") -> pd.DataFrame:
+        """
+        Return every leg run by every team as a single dataframe of interned previous and current
+        control indices and the split time in seconds, excluding late penalty rows which don't move
+        """
+        columns = {"prev": np.zeros(0, dtype=np.int64),
+                   "curr": np.zeros(0, dtype=np.int64),
+                   "split_secs": np.zeros(0, dtype=np.float64)}
+        if not results:
+            return pd.DataFrame(columns)
+
+        all_results = pd.concat(results.values(), ignore_index=True)
+        curr = all_results.control.map(self.control_index).to_numpy(dtype=np.int64)
+
+        # each team starts its first leg from HH
+        team_starts = np.zeros(len(results), dtype=np.int64)
+        np.cumsum([len(result) for result in results.values()][:-1], out=team_starts[1:])
+        team_starts = team_starts[team_starts < len(curr)]
+        prev = np.roll(curr, 1)
+        prev[team_starts] = self.control_index["HH"]
+
+        split_secs = all_results.time_split.to_numpy().astype("timedelta64[ms]").astype(np.int64) / 1000
+        moved = prev != curr
+        return pd.DataFrame({"prev": prev[moved], "curr": curr[moved], "split_secs": split_secs[moved]})
 
     def parse_control_statistics_txt(self) -> pd.DataFrame:
         """
         Parse a txt file containing the control statistics for the event and return a pandas dataframe
         """
-        control_statistics = pd.DataFrame(columns=["control", "visit_count"])
-        for line_num, line in enumerate(open(self.config["control_statistics"], "r")):
-            if line_num == 0:
-                continue
-
-            line = line.split()
-            if len(line[0]) == 2:
-                entry = [line[0], line[1]]
-                control_statistics.loc[len(control_statistics)] = entry
+        controls = []
+        visit_counts = []
+        with open(self.config["control_statistics"], "r") as control_statistics_fp:
+            for line_num, line in enumerate(control_statistics_fp):
+                if line_num == 0:
+                    continue
+
+                line = line.split()
+                if len(line[0]) == 2:
+                    controls.append(line[0])
+                    visit_counts.append(line[1])
+
+        control_statistics = pd.DataFrame({"control": controls, "visit_count": visit_counts},
+                                          columns=["control", "visit_count"])
         return control_statistics
 
     def parse_control_statistics_csv(self) -> pd.DataFrame:
@@ -173,15 +385,19 @@ class ResultsReader:
         """
         Parse a txt file containing the leg statistics for the event and return a pandas dataframe
         """
-        leg_statistics = pd.DataFrame(columns=["leg", "leg_count"])
-        for line_num, line in enumerate(open(self.config["leg_statistics"], "r")):
-            if line_num == 0:
-                continue
-
-            line = line.split()
-            if len(line[0]) == 5:
-                entry = [line[0], line[1]]
-                leg_statistics.loc[len(leg_statistics)] = entry
+        legs = []
+        leg_counts = []
+        with open(self.config["leg_statistics"], "r") as leg_statistics_fp:
+            for line_num, line in enumerate(leg_statistics_fp):
+                if line_num == 0:
+                    continue
+
+                line = line.split()
+                if len(line[0]) == 5:
+                    legs.append(line[0])
+                    leg_counts.append(line[1])
+
+        leg_statistics = pd.DataFrame({"leg": legs, "leg_count": leg_counts}, columns=["leg", "leg_count"])
         return leg_statistics
 
     def parse_leg_statistics_csv(self) -> pd.DataFrame:
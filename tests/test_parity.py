@@ -0,0 +1,134 @@
+import datetime
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from benchmarks.synthetic_event import SyntheticEventGenerator
+from results_plotter.leaderboard import Leaderboard
+from results_plotter.position_engine import PositionEngine
+from results_reader import results_reader
+import utils
+
+# a short event, so some teams finish late and their results end with a late penalty
+N_TEAMS = 40
+EVENT_LENGTH = 3.0
+
+@pytest.fixture(scope="module")
+def event(tmp_path_factory):
+    """
+    A synthetic event parsed by the current parser, as (config, control_coordinates, results)
+    """
+    config_path = SyntheticEventGenerator(N_TEAMS, n_controls=30, map_size=1000, event_length=EVENT_LENGTH, seed=3).generate(
+        tmp_path_factory.mktemp("event"))
+    with open(config_path, "r") as config_fp:
+        config = yaml.safe_load(config_fp)
+    control_coordinates = utils.get_control_coordinates(config)
+    results = results_reader.ResultsReader(config, control_coordinates).parse_txt_results_directory(workers=1)
+    return config, control_coordinates, results
+
+def seek_times(results, n_times: int, seed: int) -> "list[float]":
+    """
+    Random event times, in no particular order, including the exact times controls were reached
+    """
+    rng = np.random.default_rng(seed)
+    end_secs = int(max(result.cumulative_time.max() for result in results.values()).total_seconds()) + 60
+    control_secs = np.concatenate([result.cumulative_time.dt.total_seconds().to_numpy() for result in results.values()])
+    # halves are exact in binary, so both implementations see the same millisecond
+    times = list(rng.integers(0, end_secs, n_times) + 0.5) + list(rng.choice(control_secs, n_times))
+    rng.shuffle(times)
+    return [float(t_event) for t_event in times] + [0.0, float(end_secs)]
+
+def reference_position(result: pd.DataFrame, control_coordinates, t_event: float) -> "tuple[int, int]":
+    """
+    A team's interpolated position, as the replay computed it per team before the position engine
+    """
+    t_event_timedelta = datetime.timedelta(seconds=t_event)
+    reached = result[result.cumulative_time < t_event_timedelta]
+    if reached.empty:
+        prev_control, prev_time, prev_idx = "HH", datetime.timedelta(0), -1
+    else:
+        prev_control, prev_time, prev_idx = reached.control.values[-1], reached.cumulative_time.iloc[-1], reached.index[-1]
+    next_row = result.iloc[min(prev_idx + 1, len(result) - 1)]
+
+    prev_px = control_coordinates[prev_control]
+    next_px = control_coordinates[next_row.control]
+    time_frac = 0
+    if next_row.time_split != datetime.timedelta(0):
+        time_frac = (t_event_timedelta - prev_time) / next_row.time_split
+    return (int(prev_px.x + (next_px.x - prev_px.x) * time_frac),
+            int(prev_px.y + (next_px.y - prev_px.y) * time_frac))
+
+def reference_standings(results, t_event: float) -> "list[tuple[str, int]]":
+    """
+    Every team ordered by points, as the replay sorted them on every frame before the leaderboard
+    """
+    team_points = []
+    for team_number, result in results.items():
+        reached = result[result.cumulative_time < datetime.timedelta(seconds=t_event)]
+        team_points.append((team_number, int(reached.cumulative_points.values[-1]) if not reached.empty else 0))
+    return list(reversed(sorted(team_points, key=lambda tup: tup[1])))
+
+def reference_parse(filepath, control_coordinates, pixels_per_km: float) -> pd.DataFrame:
+    """
+    Parse a txt result line by line, as the parser did before it was vectorised
+    """
+    rows = []
+    with open(filepath) as result_fp:
+        for line_num, line in enumerate(result_fp):
+            if line_num < 3 or line.startswith("No") or line.startswith("Distance") or line == "\n":
+                continue
+            if line.lstrip().startswith("Late Penalty"):
+                control, points, time_split = "HH", rows[-1][1] + int(line.split()[-1]), "00:00:00"
+            else:
+                _no, control, _time, _dist, _cm_dist, points, time_split, *_other = line.lstrip().split()
+            if time_split.count(":") == 1:
+                time_split = "00:" + time_split
+            prev_control = rows[-1][0] if rows else "HH"
+            prev_px, curr_px = control_coordinates[prev_control], control_coordinates[control]
+            distance = math.hypot(prev_px.x - curr_px.x, prev_px.y - curr_px.y) / pixels_per_km
+            rows.append((control, int(float(points)), pd.Timedelta(time_split), distance))
+
+    result = pd.DataFrame(rows, columns=["control", "cumulative_points", "time_split", "distance"])
+    result["cumulative_time"] = result.time_split.cumsum()
+    result["cumulative_distance"] = result.distance.cumsum()
+    return result
+
+def test_parser_matches_reference(event):
+    config, control_coordinates, results = event
+    pixels, metres = config["map_scale_pixels"].split(":")
+    pixels_per_km = int(pixels) / int(metres) * 1000
+
+    assert len(results) == N_TEAMS
+    assert any(result.control.values[-1] == "HH" and result.time_split.iloc[-1] == datetime.timedelta(0)
+               for result in results.values()), "no team finished late, the penalty path is untested"
+    for team_number, result in results.items():
+        filepath = f"{config['results_directory']}/{team_number}_result.txt"
+        expected = reference_parse(filepath, control_coordinates, pixels_per_km)
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False)
+
+def test_positions_match_reference(event):
+    _config, control_coordinates, results = event
+    engine = PositionEngine(results, control_coordinates)
+
+    for t_event in seek_times(results, 30, seed=0):
+        positions = engine.positions(t_event).tolist()
+        for team_number, position in zip(engine.team_numbers, positions):
+            expected = reference_position(results[team_number], control_coordinates, t_event)
+            assert tuple(position) == expected, (team_number, t_event)
+
+@pytest.mark.parametrize("keyframe_interval", [1, 2, 7, 64])
+def test_standings_match_reference_at_random_seeks(event, keyframe_interval):
+    config, control_coordinates, results = event
+    engine = PositionEngine(results, control_coordinates)
+    board = Leaderboard(engine, config["team_number"], keyframe_interval=keyframe_interval)
+
+    for t_event in seek_times(results, 60, seed=keyframe_interval):
+        board.seek(t_event)
+        expected = reference_standings(results, t_event)
+        assert board.standings() == expected, t_event
+        assert board.top_teams == expected[:board.top_count], t_event
+        focus_position = [team for team, _points in expected].index(config["team_number"]) + 1
+        assert (board.focus_position, board.focus_points) == (focus_position, expected[focus_position - 1][1])
@@ -5,7 +5,9 @@ import easygui
 import yaml
 
 from map_reader import map_reader
+from results_plotter import baked_trajectory
 from results_plotter import results_plotter
+from results_reader import event_bundle
 from results_reader import results_reader
 import utils
 
@@ -21,6 +23,9 @@ class UserGui:
         self.control_coords = {}    # str: PixelCoordinate
         self.leg_stats = [] # pd.DataFrame
         self.control_stats = [] # pd.DataFrame
+        self.event_bundle = None    # EventBundle, only set while it is up to date with the results
+        self.derive_leg_stats = False
+        self.derive_control_stats = False
 
     def show_homepage(self):
         """
@@ -54,6 +59,15 @@ class UserGui:
         with open(config_path, "r") as config_fp:
             self.config = yaml.safe_load(config_fp)
 
+        # load the event details from the event bundle if it is up to date with the results, leaving
+        # the results themselves until the replay needs them
+        bundle = event_bundle.EventBundle.for_config(self.config)
+        if bundle.is_current(self.config):
+            self.event_bundle = bundle
+            _config, self.control_coords, self.leg_stats, self.control_stats = self.event_bundle.load_details()
+            self.results_rdr = results_reader.ResultsReader(self.config, self.control_coords)
+            return
+
         self.control_coords = utils.get_control_coordinates(self.config)
         self.results_rdr = results_reader.ResultsReader(self.config, self.control_coords)
         self.leg_stats = self.results_rdr.parse_leg_statistics_csv()
@@ -65,8 +79,8 @@ class UserGui:
         - team number and event length
         - path to directory containing results txt files
         - path to map
-        - path to leg statistics txt file
-        - path to control statistics txt file
+        - path to leg statistics txt file, or calculate them from the results
+        - path to control statistics txt file, or calculate them from the results
         - path to directory to save control coordinates csv
         - path to save config file
         """
@@ -102,12 +116,41 @@ class UserGui:
         """
         Open windows to replay event result
         """
+        # play back from the baked trajectory if it is up to date, baking it first if asked to in the config
+        # a live replay changes as results arrive, so is never baked
+        trajectory = baked_trajectory.TrajectoryFile.for_config(self.config)
+        if self.config.get("live_follow", False):
+            trajectory = None
+        elif not trajectory.is_current(self.config):
+            if self.config.get("bake_trajectory", False):
+                trajectory.bake(self.config, self._load_results(), self.control_coords)
+            else:
+                trajectory = None
+
+        # a baked replay plays from the trajectory alone, so the results are never loaded
+        results = self._load_results() if trajectory is None else {}
+        pltr = results_plotter.ResultsPlotter(self.config, results, self.control_coords, self.leg_stats, trajectory)
+        pltr.plot_results()
+        pltr.display_leg_stats()
+
+    def _load_results(self) -> "dict[str, pd.Dataframe]":
+        """
+        Load the results from the event bundle if it is up to date, otherwise parse the csv results
+        and bundle them so the next load can skip the csv files
+        """
+        if self.results:
+            return self.results
+
+        if self.event_bundle is not None:
+            self.results = self.event_bundle.load_results()
+            return self.results
+
         self.results = self.results_rdr.parse_csv_results_directory()
         self.control_stats = self.results_rdr.parse_control_statistics_csv()
         self.leg_stats = self.results_rdr.parse_leg_statistics_csv()
-        pltr = results_plotter.ResultsPlotter(self.config, self.results, self.control_coords, self.leg_stats)
-        pltr.plot_results()
-        pltr.display_leg_stats()
+        self.event_bundle = event_bundle.EventBundle.for_config(self.config)
+        self.event_bundle.write(self.config, self.control_coords, self.results, self.leg_stats, self.control_stats)
+        return self.results
 
     def _get_text_input(self):
         """
@@ -144,12 +187,21 @@ class UserGui:
         title = "Results directory selection"
         results_dir = easygui.diropenbox(msg, title)
         self.config["results_directory"] = results_dir
-        
-        # parse txt files to csv
+
+        # any statistics the user didn't provide are calculated from the results, and kept up to
+        # date with them each time the results are updated
+        if self.derive_leg_stats:
+            self.config["derive_leg_statistics"] = True
+            self.config["leg_statistics"] = str(Path(results_dir) / "leg-statistics.csv")
+
+        if self.derive_control_stats:
+            self.config["derive_control_statistics"] = True
+            self.config["control_statistics"] = str(Path(results_dir) / "control-statistics.csv")
+
+        # parse txt files to csv, only those added or changed since the directory was last parsed
         control_coords = utils.get_control_coordinates(self.config)
         temp_results_rdr = results_reader.ResultsReader(self.config, control_coords)
-        temp_results = temp_results_rdr.parse_txt_results_directory()
-        temp_results_rdr.write_csv_results(temp_results)
+        temp_results_rdr.update_txt_results_directory()
     
     def _get_map_path(self):
         """
@@ -176,34 +228,46 @@ class UserGui:
     def _get_leg_stats(self):
         """
         Get path to leg statistics
+        If the user cancels, the leg statistics are derived from the results instead
         """
-        msg = "Select the leg statistics file"
+        msg = "Select the leg statistics file\nPress <cancel> to calculate them from the results"
         title = "Leg statistics selection"
         filetypes = ["*.txt"]
         leg_stats_file = easygui.fileopenbox(msg, title, filetypes=filetypes)
+        if leg_stats_file is None:
+            self.derive_leg_stats = True
+            return
+
         leg_stats_dir = Path(leg_stats_file).parent
-        self.config["leg_statistics"] = str(leg_stats_dir / "leg-statistics.csv")
 
         # write file as csv
+        self.config["leg_statistics"] = leg_stats_file
         temp_results_rdr = results_reader.ResultsReader(self.config, {})
         leg_stats = temp_results_rdr.parse_leg_statistics_txt()
         temp_results_rdr.write_leg_statistics_csv(leg_stats, leg_stats_dir)
+        self.config["leg_statistics"] = str(leg_stats_dir / "leg-statistics.csv")
 
     def _get_control_stats(self):
         """
         Get path to control statistics
+        If the user cancels, the control statistics are derived from the results instead
         """
-        msg = "Select the control statistics file"
+        msg = "Select the control statistics file\nPress <cancel> to calculate them from the results"
         title = "Control statistics selection"
         filetypes = ["*.txt"]
         control_stats_file = easygui.fileopenbox(msg, title, filetypes=filetypes)
+        if control_stats_file is None:
+            self.derive_control_stats = True
+            return
+
         control_stats_dir = Path(control_stats_file).parent
-        self.config["control_statistics"] = str(control_stats_dir / "control-statistics.csv")
 
         # parse txt file to csv
+        self.config["control_statistics"] = control_stats_file
         temp_results_rdr = results_reader.ResultsReader(self.config, {})
         control_stats = temp_results_rdr.parse_control_statistics_txt()
         temp_results_rdr.write_control_statistics_csv(control_stats, control_stats_dir)
+        self.config["control_statistics"] = str(control_stats_dir / "control-statistics.csv")
     
     def _get_config_save_location(self):
         """